@@ -0,0 +1,70 @@
+"""Deterministic inputs for the benchmark suite."""
+import random
+
+_TOPICS = [
+    "recursion", "stacks", "queues", "photosynthesis", "thermodynamics", "normalization",
+    "entropy", "osmosis", "derivatives", "integrals", "databases", "sorting", "graphs",
+    "mitochondria", "inflation", "supply", "demand", "vectors", "matrices", "algorithms",
+]
+
+
+def sentence(rng):
+    a, b, c = rng.sample(_TOPICS, 3)
+    return f"The study of {a} explains how {b} relates to {c} in many practical examples."
+
+
+def study_text(paragraphs, seed=0):
+    """Lecture-notes-like text with section headings every ten paragraphs."""
+    rng = random.Random(seed)
+    blocks = []
+    for i in range(paragraphs):
+        if i % 10 == 0:
+            blocks.append(f"CHAPTER {i // 10 + 1}")
+        blocks.append(" ".join(sentence(rng) for _ in range(6)))
+    return "\n\n".join(blocks)
+
+
+def chat_history(messages, seed=0):
+    """Alternating user/assistant messages, as the chat pages store them."""
+    rng = random.Random(seed)
+    history = []
+    for i in range(messages):
+        role = "user" if i % 2 == 0 else "assistant"
+        text = sentence(rng) if role == "user" else "\n".join(sentence(rng) for _ in range(8))
+        history.append({"role": role, "text": text, "meta": {}})
+    return history
+
+
+def make_pdf(pages, lines_per_page=40, seed=0):
+    """A minimal text PDF (one Helvetica text block per page) as bytes."""
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for _ in range(pages):
+        lines = [sentence(rng) for _ in range(lines_per_page)]
+        body = "BT /F1 10 Tf 40 800 Td 12 TL " + " ".join(
+            "(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") '"
+            for line in lines
+        ) + " ET"
+        content = body.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for n, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % n + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
@@ -0,0 +1,218 @@
+"""Headless end-to-end benchmarks for the NexStudy pages.
+
+Every scenario runs in a fresh subprocess against the offline fake Gemini
+backend, with empty caches, and records:
+
+    import_s        time spent importing modules during the first run
+                    (`python -X importtime`, top-level imports summed)
+    first_run_s     first script run
+    rerun_p50_s     median of plain reruns
+    rerun_p95_s     95th percentile of plain reruns
+    action_s        the scenario's interaction with a large input
+    peak_rss_mb     peak resident memory of the process
+
+Usage:
+    python benchmarks/run.py                      # all scenarios, compare to baseline
+    python benchmarks/run.py quiz_large tutor     # selected scenarios
+    python benchmarks/run.py --update-baseline    # store results as the new baseline
+    python benchmarks/run.py --repeat 5 tutor     # median of 5 runs (default 3)
+
+Results go to benchmarks/results.json. The exit status is 1 when a metric
+regresses past the tolerance relative to benchmarks/baseline.json.
+
+Each metric is the median over --repeat runs of the scenario, which keeps
+cold-start noise from failing the comparison. Timings still depend on the
+machine, so only compare against a baseline recorded on the same machine:
+on a new machine (or a CI runner), record one first with --update-baseline,
+then make the change and run again.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+BASELINE = os.path.join(HERE, "baseline.json")
+RESULTS = os.path.join(HERE, "results.json")
+
+# A metric regresses when it is both this much slower (relative) and at least
+# the absolute floor worse, so sub-millisecond noise doesn't fail the run.
+# Cold-start timings (disk, import caches) swing by a few hundred ms from run
+# to run even on one machine, so they get wider floors. First match wins.
+TOLERANCE = 0.25
+FLOORS = {"import_s": 0.4, "first_run_s": 0.5, "_s": 0.05, "_mb": 10.0}
+
+FIRST_RUN_START = "benchmark: first run starts"
+FIRST_RUN_END = "benchmark: first run ends"
+
+
+def _child(name, reruns):
+    """Run one scenario in this process and print its metrics as JSON."""
+    warnings.simplefilter("ignore")
+    sys.path.insert(0, HERE)
+    sys.path.insert(0, ROOT)
+    import scenarios
+
+    app, action = scenarios.SCENARIOS[name]()
+    print(FIRST_RUN_START, file=sys.stderr, flush=True)
+    start = time.perf_counter()
+    app.run()
+    first = time.perf_counter() - start
+    print(FIRST_RUN_END, file=sys.stderr, flush=True)
+
+    times = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        times.append(time.perf_counter() - start)
+    times.sort()
+
+    action_s = None
+    if action:
+        start = time.perf_counter()
+        action(app)
+        action_s = time.perf_counter() - start
+    exception = [e.value for e in getattr(app, "exception", [])]
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "first_run_s": round(first, 4),
+        "rerun_p50_s": round(times[len(times) // 2], 4),
+        "rerun_p95_s": round(times[int(0.95 * (len(times) - 1))], 4),
+        "action_s": None if action_s is None else round(action_s, 4),
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+        "errors": exception,
+    }))
+
+
+def import_seconds(importtime_log):
+    """Seconds of top-level imports between the first-run markers of a -X importtime log."""
+    total_us = 0
+    inside = False
+    for line in importtime_log.splitlines():
+        if line == FIRST_RUN_START:
+            inside = True
+        elif line == FIRST_RUN_END:
+            break
+        elif inside and line.startswith("import time:"):
+            _, cumulative, module = line.split("|", 2)
+            if not module[1:2].isspace():  # nested imports are already in their parent's total
+                total_us += int(cumulative)
+    return round(total_us / 1e6, 4)
+
+
+def run_scenario(name, reruns):
+    sys.path.insert(0, HERE)
+    import scenarios
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(
+            os.environ,
+            GEMINI_BACKEND="fake",
+            FAKE_GEMINI_LATENCY=scenarios.LATENCY_OVERRIDES.get(name, "fixed:0"),
+            NEXSTUDY_CACHE_DIR=cache_dir,
+            NEXSTUDY_GEMINI_RPM="1000000",
+            NEXSTUDY_GEMINI_TPM="1000000000",
+        )
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", __file__, "--child", name, "--reruns", str(reruns)],
+            env=env, capture_output=True, text=True, cwd=ROOT,
+        )
+    if proc.returncode != 0:
+        errors = [line for line in proc.stderr.strip().splitlines() if not line.startswith("import time:")]
+        return {"errors": [errors[-1] if errors else "failed"]}
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["import_s"] = import_seconds(proc.stderr)
+    return result
+
+
+def run_repeated(name, reruns, repeat):
+    """Per-metric medians over `repeat` runs of a scenario; the first failing run on error."""
+    runs = [run_scenario(name, reruns) for _ in range(repeat)]
+    for result in runs:
+        if result.get("errors"):
+            return result
+    merged = {}
+    for metric, value in runs[0].items():
+        if isinstance(value, (int, float)):
+            merged[metric] = round(statistics.median(r[metric] for r in runs), 4)
+        else:
+            merged[metric] = value
+    return merged
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of (scenario, metric, baseline, current) regressions."""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(name, {}).get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(base, (int, float)):
+                continue
+            floor = next((f for suffix, f in FLOORS.items() if metric.endswith(suffix)), 0)
+            if value > base * (1 + tolerance) and value - base > floor:
+                regressions.append((name, metric, base, value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", help="scenario names (default: all)")
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario; metrics are medians")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.reruns)
+        return 0
+
+    sys.path.insert(0, HERE)
+    import scenarios
+
+    names = args.scenarios or list(scenarios.SCENARIOS)
+    results = {}
+    for name in names:
+        results[name] = run_repeated(name, args.reruns, max(1, args.repeat))
+        m = results[name]
+        status = "ERROR " + "; ".join(m["errors"]) if m.get("errors") else ""
+        print(f"{name:30} first {m.get('first_run_s', '-'):>8}s  rerun p50 {m.get('rerun_p50_s', '-'):>8}s  "
+              f"action {m.get('action_s') or '-':>8}s  rss {m.get('peak_rss_mb', '-'):>7}MB  {status}")
+
+    with open(RESULTS, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(BASELINE):
+            with open(BASELINE) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(BASELINE, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline updated: {BASELINE}")
+        return 0
+
+    if not os.path.exists(BASELINE):
+        print("No baseline yet; run with --update-baseline to create one.")
+        return 0
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for name, metric, base, value in regressions:
+        print(f"REGRESSION {name}.{metric}: {base} -> {value}")
+    failed = any(results[n].get("errors") for n in names)
+    return 1 if regressions or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""Benchmark scenarios: one per page (plus PDF extraction on its own).
+
+Each scenario returns (app, action). The runner times the first run, a few
+plain reruns, then `action(app)`: the interaction with a large input that
+the scenario is about. `app` may be None for component-only scenarios.
+"""
+import os
+import sys
+
+from streamlit.testing.v1 import AppTest
+
+import fixtures
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIMEOUT = 300
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(fn):
+        SCENARIOS[name] = fn
+        return fn
+    return register
+
+
+def _app(path):
+    return AppTest.from_file(os.path.join(ROOT, path), default_timeout=TIMEOUT)
+
+
+def _click(app, label):
+    next(b for b in app.button if b.label == label).click()
+    app.run()
+
+
+@scenario("main_app")
+def main_app():
+    return _app("main_app.py"), None
+
+
+@scenario("dashboard")
+def dashboard():
+    return _app("pages/3_Dashboard.py"), None
+
+
+@scenario("dashboard_with_results")
+def dashboard_with_results():
+    """A student with a quiz history, so the progress chart is drawn."""
+    sys.path.insert(0, ROOT)
+    from utils import results_store
+
+    store = results_store.results()
+    for i in range(200):
+        store.record("bench-student", 5 + i % 6, 10, ts=1_700_000_000 + i * 3600)
+    app = _app("pages/3_Dashboard.py")
+    app.session_state["user_id"] = "bench-student"
+
+    def action(app):
+        app.radio[0].set_value(app.radio[0].options[-1]).run()
+    return app, action
+
+
+@scenario("summarizer_large")
+def summarizer_large():
+    text = fixtures.study_text(400)  # ~200 KB: exercises the map-reduce path
+
+    def action(app):
+        app.text_area[0].input(text)
+        _click(app, "✨ Generate Summary")
+    return _app("pages/1_Summarizer.py"), action
+
+
+def _summarizer_mode(label):
+    text = fixtures.study_text(20)
+
+    def build():
+        def action(app):
+            app.radio[0].set_value(label)
+            app.text_area[0].input(text)
+            _click(app, "✨ Generate Summary")
+        return _app("pages/1_Summarizer.py"), action
+    return build
+
+
+# Mode comparison needs upstream latency to be visible; see LATENCY_OVERRIDES.
+scenario("summarizer_mode_fused")(_summarizer_mode("⚡ Fused (one call)"))
+scenario("summarizer_mode_pipelined")(_summarizer_mode("🔀 Pipelined (summary + keywords in parallel)"))
+scenario("summarizer_mode_sequential")(_summarizer_mode("🐢 Sequential (summary, then keywords)"))
+
+
+@scenario("quiz_large")
+def quiz_large():
+    text = fixtures.study_text(1500)  # roughly a 300-page course pack's worth of text
+
+    def action(app):
+        app.radio[0].set_value("Paste Text").run()
+        app.text_area[0].input(text).run()
+        app.slider[0].set_value(50).run()
+        _click(app, "Generate Quiz")
+    return _app("pages/2_Quiz_Generator.py"), action
+
+
+@scenario("doubt_solver_200_messages")
+def doubt_solver():
+    app = _app("pages/6_Doubt_Solver.py")
+    app.session_state["messages"] = fixtures.chat_history(200)
+
+    def action(app):
+        app.text_area(key="user_input").input("Explain recursion with an example.")
+        _click(app, "Send")
+    return app, action
+
+
+@scenario("flashcards_200_messages")
+def flashcards():
+    app = _app("pages/Flashcards.py")
+    app.session_state["messages"] = fixtures.chat_history(200)
+
+    def action(app):
+        app.text_area(key="u_in").input("Explain queues.")
+        _click(app, "🚀 Send")
+    return app, action
+
+
+@scenario("tutor")
+def tutor():
+    def action(app):
+        app.text_input[0].input("Recursion")
+        _click(app, "🧠 Explain Topic")
+    return _app("pages/6_AI_Tutor.py"), action
+
+
+@scenario("coding_studio")
+def coding_studio():
+    def action(app):
+        app.text_area[0].input("A function that reverses a linked list")
+        _click(app, "🚀 Generate Code")
+    return _app("pages/5_AI_Coding_Studio.py"), action
+
+
+@scenario("pdf_extract_300_pages")
+def pdf_extract():
+    """Cold extraction on first run; the action re-extracts from the page cache."""
+    sys.path.insert(0, ROOT)
+    from utils import pdf_extract as extractor
+
+    data = fixtures.make_pdf(300)
+
+    class Component:
+        def run(self):
+            extractor.extract_text(data)
+
+    def action(component):
+        extractor.extract_text(data)
+    return Component(), action
+
+
+# Fake-backend latency per scenario (seconds); everything else uses 0 so the
+# numbers measure the app's own overhead.
+LATENCY_OVERRIDES = {
+    "summarizer_mode_fused": "fixed:0.5",
+    "summarizer_mode_pipelined": "fixed:0.5",
+    "summarizer_mode_sequential": "fixed:0.5",
+}
@@ -1,25 +1,20 @@
 import streamlit as st
-import google.generativeai as genai
+import time
 
-# ---------------- GEMINI INIT ----------------
-@st.cache_resource
-def init_gemini():
-    try:
-        key = st.secrets["GEMINI_API_KEY"]
-        genai.configure(api_key=key)
-
-        try:
-            return genai.GenerativeModel("gemini-2.5-flash")
-        except:
-            st.warning("⚠️ Gemini 2.5 Flash not available. Switching to Gemini 2.0 Flash.")
-            return genai.GenerativeModel("gemini-2.0-flash")
-
-    except Exception as e:
-        st.error(f"Gemini initialization error: {e}")
-        return None
+from utils import gemini_client, summarize
+from utils.ui import get_user_id
 
+MODEL = "gemini-2.5-flash"
+SUMMARY_MODES = {
+    "⚡ Fused (one call)": "fused",
+    "🔀 Pipelined (summary + keywords in parallel)": "pipelined",
+    "🐢 Sequential (summary, then keywords)": "sequential",
+}
 
-model = init_gemini()   # <-- FIX: Now the correct variable is used everywhere
+# ---------------- GEMINI INIT ----------------
+api_key = gemini_client.get_api_key()
+if not api_key:
+    st.error("Gemini initialization error: GEMINI_API_KEY is not configured.")
 
 # ---------------- UI ----------------
 st.title("📄 Smart Text Summarizer (NexStudy)")
@@ -29,38 +24,33 @@ st.write(
 
 text_input = st.text_area("✍️ Enter or paste your text here:", height=200)
 
-# ---------------- FUNCTIONS ----------------
-def generate_summary(text):
-    if not model:
-        return None
-    try:
-        response = model.generate_content(
-            f"Summarize the following text clearly, simply, and in bullet points:\n\n{text}"
-        )
-        return response.text.strip()
-    except Exception as e:
-        st.error(f"Error generating summary: {e}")
-        return None
+mode_label = st.radio("⚙️ Mode:", list(SUMMARY_MODES), horizontal=True)
 
+if "summary_timings" not in st.session_state:
+    st.session_state.summary_timings = {}
 
-def extract_keywords(summary):
-    if not model:
-        return None
+# ---------------- FUNCTIONS ----------------
+def generate_summary(text, mode="fused"):
+    """Return (summary, keywords); long notes are chunked and summarized map-reduce style."""
+    if not api_key:
+        return None, None
     try:
-        response = model.generate_content(
-            f"Extract 5–10 important keywords from this summary, comma-separated:\n\n{summary}"
+        return summarize.summarize_with_keywords(
+            text, mode=mode, model_name=MODEL, api_key=api_key, user_id=get_user_id()
         )
-        return response.text.strip()
     except Exception as e:
-        st.error(f"Error extracting keywords: {e}")
-        return None
+        st.error(f"Error generating summary: {e}")
+        return None, None
 
 
 # ---------------- MAIN LOGIC ----------------
 if st.button("✨ Generate Summary"):
     if text_input.strip():
+        mode = SUMMARY_MODES[mode_label]
+        start = time.perf_counter()
         with st.spinner("Analyzing and summarizing..."):
-            summary = generate_summary(text_input)
+            summary, keywords = generate_summary(text_input, mode)
+        elapsed = time.perf_counter() - start
 
         if summary:
             st.subheader("🧠 Summary")
@@ -74,13 +64,17 @@ if st.button("✨ Generate Summary"):
                 mime="text/plain",
             )
 
-            # Extract Keywords
-            with st.spinner("Finding key concepts..."):
-                keywords = extract_keywords(summary)
-
             if keywords:
                 st.subheader("🔑 Key Concepts / Keywords")
                 st.success(keywords)
 
+            # Timings per mode, so the modes can be compared on real notes
+            st.session_state.summary_timings.setdefault(mode, []).append(elapsed)
+            averages = " · ".join(
+                f"{m}: {sum(t) / len(t):.1f}s avg over {len(t)}"
+                for m, t in st.session_state.summary_timings.items()
+            )
+            st.caption(f"⏱️ Generated in {elapsed:.1f}s ({mode}). {averages}")
+
     else:
         st.warning("Please enter some text before summarizing.")
@@ -1,68 +1,32 @@
 import streamlit as st
-import pdfplumber
-import json
-import google.generativeai as genai
 
-# ---------------- GEMINI API SETUP ----------------
-genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
-
-# ---------------- PDF EXTRACTION ----------------
-def extract_text_from_pdf(uploaded_file):
-    """Extract text safely from uploaded PDF"""
-    text = ""
-    with pdfplumber.open(uploaded_file) as pdf:
-        for page in pdf.pages:
-            text += page.extract_text() or ""
-    return text
+from utils import local_quiz, question_bank, quiz_gen, results_store, scheduler
+from utils.ui import extract_text_from_pdf, get_user_id, show_estimated_wait
 
+MODEL = "gemini-2.5-flash"
+ENGINES = {
+    "🤖 Gemini AI": "ai",
+    "⚡ Offline (instant, fill-in-the-blank)": "local",
+}
 
 # ---------------- GEMINI QUIZ GENERATION ----------------
-def generate_questions_ai(text, num_questions=5):
-    """Generate MCQ questions using Gemini"""
-    try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
-
-        prompt = f"""
-You are an expert MCQ Quiz Generator.
-Generate exactly {num_questions} multiple-choice questions from the text below.
-
-TEXT:
-{text}
-
-INSTRUCTIONS:
-- Output MUST be valid JSON only.
-- NO markdown.
-- NO commentary.
-- JSON must have a top-level key "questions".
-- Each question must include:
-    "question": string
-    "options": list of 4 strings
-    "answer": string (must be exactly one of the options)
-
-RETURN ONLY THIS FORMAT:
-{{
-  "questions": [
-    {{
-      "question": "...",
-      "options": ["A", "B", "C", "D"],
-      "answer": "A"
-    }}
-  ]
-}}
-"""
-
-        response = model.generate_content(prompt)
-        raw = response.text.strip()
-
-        # Clean markdown formatting if present
-        raw = raw.replace("```json", "").replace("```", "").strip()
-
-        data = json.loads(raw)
-        return data["questions"]
+def generate_questions_ai(text, num_questions=5, preview=None):
+    """Generate MCQ questions using Gemini (chunked and concurrent for large quizzes).
 
+    Questions are listed in `preview` as they arrive; on an error the ones
+    received so far are kept.
+    """
+    questions = []
+    try:
+        for q in quiz_gen.stream_questions(text, num_questions, model_name=MODEL, user_id=get_user_id()):
+            questions.append(q)
+            if preview is not None:
+                lines = [f"**Q{i+1}. {x['question']}**" for i, x in enumerate(questions)]
+                lines.append(f"⏳ {len(questions)}/{num_questions} questions ready...")
+                preview.markdown("\n\n".join(lines))
     except Exception as e:
         st.error(f"❌ Gemini Quiz Generation Error: {e}")
-        return []
+    return questions
 
 
 # ---------------- STREAMLIT UI ----------------
@@ -82,16 +46,37 @@ def reset_quiz():
     st.session_state.quiz = []
     st.session_state.quiz_generated = False
     st.session_state.quiz_submitted = False
+    st.session_state.quiz_recorded = False
+
+
+def generate_and_store_quiz(text_data, num_questions, fresh=False, engine="ai"):
+    if not text_data.strip():
+        return
+    if engine == "local":
+        with st.spinner(f"Building {num_questions} questions..."):
+            quiz = local_quiz.generate_questions(text_data, num_questions)
+    else:
+        # Material seen before: assemble the quiz from the shared question bank.
+        bank = question_bank.bank()
+        doc_hash = question_bank.document_hash(text_data)
+        quiz = [] if fresh else bank.assemble(doc_hash, num_questions)
+        if quiz:
+            st.caption("📚 Assembled from the question bank, no AI call needed.")
+        else:
+            show_estimated_wait(scheduler.BULK)
+            preview = st.empty()
+            with st.spinner(f"Generating {num_questions} questions..."):
+                quiz = generate_questions_ai(text_data, num_questions, preview)
+            preview.empty()
+            bank.add(doc_hash, quiz)
+
+    st.session_state.quiz = quiz
+    st.session_state.quiz_generated = True
+    st.session_state.quiz_submitted = False
+    st.session_state.quiz_recorded = False
 
-
-def generate_and_store_quiz(text_data):
-    if text_data.strip():
-        st.session_state.quiz = generate_questions_ai(text_data)
-        st.session_state.quiz_generated = True
-        st.session_state.quiz_submitted = False
-
-        for i, q in enumerate(st.session_state.quiz):
-            st.session_state[f'answer_{i}'] = q["options"][0]
+    for i, q in enumerate(st.session_state.quiz):
+        st.session_state[f'answer_{i}'] = q["options"][0]
 
 
 # ---------------- Input Section ----------------
@@ -101,14 +86,30 @@ text_data = ""
 if input_type == "Upload PDF":
     uploaded_file = st.file_uploader("Upload a PDF (max 10 MB)", type="pdf", on_change=reset_quiz)
     if uploaded_file:
-        text_data = extract_text_from_pdf(uploaded_file)
+        text_data = extract_text_from_pdf(uploaded_file, feature="quiz.pdf")
+        if not text_data.strip():
+            st.warning("⚠️ No readable text found in this PDF, even after OCR. Try a clearer scan.")
 else:
     text_data = st.text_area("Paste your study material here:", key='text_input', on_change=reset_quiz)
 
 
 # ---------------- Generate Button ----------------
+num_questions = st.slider("Number of questions:", min_value=5, max_value=50, value=5, step=5)
+engine = ENGINES[st.radio(
+    "Quiz engine:", list(ENGINES), horizontal=True,
+    help="The offline engine needs no API key or quota and works instantly on any amount of text.",
+)]
+fresh = engine == "ai" and st.checkbox("Always generate new questions", help="Skip the question bank and ask the AI.")
+
+if engine == "ai" and text_data.strip():
+    banked = question_bank.bank().count(question_bank.document_hash(text_data))
+    if banked:
+        st.caption(f"📚 {banked} questions on this material are already in the question bank.")
+
 if st.button("Generate Quiz", disabled=not text_data.strip()):
-    generate_and_store_quiz(text_data)
+    generate_and_store_quiz(text_data, num_questions, fresh, engine)
+    if 0 < len(st.session_state.quiz) < num_questions:
+        st.info(f"Only {len(st.session_state.quiz)} distinct questions could be generated from this material.")
 
 
 # ---------------- QUIZ SECTION ----------------
@@ -163,24 +164,11 @@ if st.session_state.quiz_generated and st.session_state.quiz:
 
 
         # ---------------- Dashboard Stats ----------------
-        if "quiz_attempts" not in st.session_state:
-            st.session_state.quiz_attempts = 0
-        if "average_accuracy" not in st.session_state:
-            st.session_state.average_accuracy = 0
-
-        prev = st.session_state.quiz_attempts
-        new_total = prev + 1
-
-        st.session_state.average_accuracy = (
-            (st.session_state.average_accuracy * prev + score) / new_total
-        )
-        st.session_state.quiz_attempts = new_total
-
-        if "results" not in st.session_state:
-            st.session_state.results = []
-
-        st.session_state.results.append({
-            "score": score,
-            "correct": correct,
-            "total": total
-        })
+        # Reruns redraw the results; store each submitted quiz only once.
+        store = results_store.results()
+        if not st.session_state.get("quiz_recorded"):
+            store.record(get_user_id(), correct, total)
+            st.session_state.quiz_recorded = True
+        stats = store.summary(get_user_id())
+        st.session_state.quiz_attempts = stats["attempts"]
+        st.session_state.average_accuracy = stats["accuracy"]
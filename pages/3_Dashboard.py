@@ -1,42 +1,80 @@
 import streamlit as st
-import random
+import time
+
+from utils import charts, metrics, results_store, srs
+from utils.ui import get_user_id
 
 st.set_page_config(page_title="Dashboard", page_icon="📊")
 
 st.title("📊 Learning Dashboard")
 st.write("Track your progress and see how much you’ve learned!")
 
-# --- Simulated stats (Phase 1: local/session only) ---
-if "quiz_attempts" not in st.session_state:
-    st.session_state.quiz_attempts = random.randint(2, 10)
-if "average_accuracy" not in st.session_state:
-    st.session_state.average_accuracy = random.randint(50, 100)
-if "summaries_made" not in st.session_state:
-    st.session_state.summaries_made = random.randint(3, 12)
-if "flashcards_created" not in st.session_state:
-    st.session_state.flashcards_created = random.randint(5, 20)
+# --- Quiz stats: running totals from the results store ---
+quiz_stats = results_store.results().summary(get_user_id())
+deck = srs.cards().deck(get_user_id())
 
 # --- Display key metrics ---
 col1, col2, col3, col4 = st.columns(4)
-col1.metric("🧠 Quizzes Attempted", st.session_state.quiz_attempts)
-col2.metric("🎯 Avg Accuracy", f"{st.session_state.average_accuracy}%")
-col3.metric("📄 Summaries Made", st.session_state.summaries_made)
-col4.metric("🎴 Flashcards Created", st.session_state.flashcards_created)
+col1.metric("🧠 Quizzes Attempted", quiz_stats["attempts"])
+col2.metric("🎯 Avg Accuracy", f"{quiz_stats['accuracy']:.0f}%")
+col3.metric("🔁 Cards Due", deck.due_count())
+col4.metric("🎴 Flashcards Created", len(deck))
 
 st.divider()
 st.subheader("📈 Progress Overview")
 
-# --- Placeholder for chart (Phase 1: random progress trend) ---
-import matplotlib.pyplot as plt
+# --- Progress chart: re-rendered only when new results arrive ---
+chart_range = st.radio("Range", list(charts.RANGES), horizontal=True, label_visibility="collapsed")
+if quiz_stats["attempts"]:
+    png = charts.progress_chart(results_store.results(), get_user_id(), quiz_stats["attempts"], chart_range)
+    st.image(png, use_column_width=True)
+else:
+    st.info("💡 Tip: Take a quiz in the Quiz Generator and your progress will appear here.")
+
+# --- Operator view: live latency and cost per page and feature ---
+@st.cache_data(ttl=60, show_spinner=False)
+def operator_stats(seconds, log_size):
+    """Headline numbers and tables for the last `seconds`.
+
+    `log_size` is only part of the cache key, so the stats are recomputed
+    when new records reach the log (or after a minute, as the window moves).
+    """
+    entries = metrics.load(since=time.time() - seconds)
+    if not entries:
+        return None
+    llm = [e for e in entries if e["kind"] == "llm"]
+    fresh = sorted(e["latency"] for e in llm if not e.get("cache_hit"))
+    return {
+        "calls": len(llm),
+        "p95": metrics.percentile(fresh, 95) or 0,
+        "cache_hits": 100 * sum(1 for e in llm if e.get("cache_hit")) / max(1, len(llm)),
+        "errors": sum(1 for e in entries if e.get("error")),
+        "by_page": metrics.aggregate(entries, key="page"),
+        "by_feature": metrics.aggregate(entries),
+    }
+
+
+st.divider()
+st.subheader("🛠️ Operator View")
+st.caption("Model calls and PDF extractions across all users, from the shared metrics log.")
 
-x = list(range(1, 8))
-y = [random.randint(40, 100) for _ in x]
+WINDOWS = {"Last hour": 3600, "Last 24 hours": 86400, "Last 7 days": 7 * 86400}
+window = st.selectbox("Time window", list(WINDOWS), index=1)
+stats = operator_stats(WINDOWS[window], metrics.log_size())
 
-plt.figure(figsize=(6, 3))
-plt.plot(x, y, marker='o')
-plt.title("Weekly Learning Progress")
-plt.xlabel("Days")
-plt.ylabel("Score (%)")
-st.pyplot(plt)
+if not stats:
+    st.info("No calls recorded in this window yet.")
+else:
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("🤖 Model Calls", stats["calls"])
+    m2.metric("⏱️ p95 Latency", f"{stats['p95']:.2f}s")
+    m3.metric("💾 Cache Hits", f"{stats['cache_hits']:.0f}%")
+    m4.metric("⚠️ Errors", stats["errors"])
 
-st.info("💡 Tip: In the next update, your real progress will appear here once we add user tracking.")
+    st.markdown("**By page**")
+    st.dataframe(stats["by_page"], use_container_width=True, hide_index=True)
+    st.markdown("**By feature**")
+    st.dataframe(stats["by_feature"], use_container_width=True, hide_index=True)
+    st.caption("Latency percentiles exclude cache hits. Token counts are Gemini's usage figures where reported.")
+    if metrics.dropped():
+        st.caption(f"⚠️ {metrics.dropped()} records were dropped before they could be written to disk.")
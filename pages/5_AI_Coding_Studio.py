@@ -1,36 +1,14 @@
 import streamlit as st
 import re
 import random
-import google.generativeai as genai
 import os
 
-st.set_page_config(page_title="AI Coding Studio", page_icon="💻", layout="wide")
+from utils import gemini_client, scheduler
+from utils.ui import get_user_id, stream_into
 
-# ------------------------------------------------------------
-# ✅ GEMINI INITIALIZATION (ROBUST VERSION)
-# ------------------------------------------------------------
-@st.cache_resource
-def init_gemini(api_key_input):
-    # 1. Try getting key from the function argument (User Input)
-    key = api_key_input
-
-    # 2. If no user input, try getting from secrets safely
-    if not key:
-        try:
-            key = st.secrets.get("GEMINI_API_KEY")
-        except Exception:
-            pass # Secrets file might not exist, just ignore
-
-    # 3. If still no key, return None (don't crash)
-    if not key:
-        return None
+st.set_page_config(page_title="AI Coding Studio", page_icon="💻", layout="wide")
 
-    try:
-        genai.configure(api_key=key)
-        return genai.GenerativeModel("gemini-2.0-flash") 
-    except Exception as e:
-        st.error(f"Gemini initialization error: {e}")
-        return None
+MODEL = "gemini-2.0-flash"
 
 # ------------------------------------------------------------
 # SIDEBAR FOR API KEY
@@ -53,8 +31,8 @@ with st.sidebar:
     else:
         st.success("✅ API Key loaded from secrets")
 
-# Initialize Model
-gemini_model = init_gemini(user_api_key)
+# Resolve the key used for every call on this page
+api_key = gemini_client.get_api_key(user_api_key)
 
 # ------------------------------------------------------------
 # PAGE CONTENT
@@ -62,7 +40,7 @@ gemini_model = init_gemini(user_api_key)
 st.title("💻 AI Coding Studio")
 st.caption("Generate, debug, and learn to code — all in one place!")
 
-if not gemini_model:
+if not api_key:
     st.error("❌ Please enter a valid Gemini API Key in the sidebar to continue.")
     st.stop()
 
@@ -85,33 +63,37 @@ with tab1:
             st.error("Please enter a prompt first.")
             st.stop()
 
-        with st.spinner("✨ Writing code..."):
-            try:
-                ai_prompt = f"""
-                You are an expert {lang} developer.
-                Generate fully working, clean and optimized code for: "{prompt}"
-                
-                RULES:
-                1. Output ONLY the code.
-                2. No markdown code fences (```) at the start or end.
-                3. No explanation text.
-                4. Include comments within the code to explain logic.
-                """
-
-                response = gemini_model.generate_content(ai_prompt)
-                
-                # Clean up potential markdown fences
-                code_result = response.text.strip()
-                if code_result.startswith("```"):
-                    lines = code_result.split("\n")
-                    if len(lines) > 2:
-                        code_result = "\n".join(lines[1:-1])
-
-                st.success(f"✅ Generated {lang} code:")
-                st.code(code_result, language=lang.lower())
-
-            except Exception as e:
-                st.error(f"Gemini Code Generation Error: {e}")
+        code_box = st.empty()
+        try:
+            ai_prompt = f"""
+            You are an expert {lang} developer.
+            Generate fully working, clean and optimized code for: "{prompt}"
+            
+            RULES:
+            1. Output ONLY the code.
+            2. No markdown code fences (```) at the start or end.
+            3. No explanation text.
+            4. Include comments within the code to explain logic.
+            """
+
+            chunks = gemini_client.generate_stream(
+                ai_prompt, model_name=MODEL, api_key=api_key, feature="coding_studio.generate",
+                charge=scheduler.Charge(get_user_id()),
+            )
+            response = stream_into(code_box, chunks, render=lambda ph, text: ph.code(text, language=lang.lower()))
+            
+            # Clean up potential markdown fences
+            code_result = response.strip()
+            if code_result.startswith("```"):
+                lines = code_result.split("\n")
+                if len(lines) > 2:
+                    code_result = "\n".join(lines[1:-1])
+
+            st.success(f"✅ Generated {lang} code:")
+            code_box.code(code_result, language=lang.lower())
+
+        except Exception as e:
+            st.error(f"Gemini Code Generation Error: {e}")
 
 # ------------------------------------------------------------
 # TAB 2 — DEBUGGER
@@ -136,37 +118,38 @@ with tab2:
             st.error("❌ Please paste some code to debug.")
             st.stop()
 
-        with st.spinner("🔍 Analyzing and fixing..."):
-            try:
-                prompt = f"""
-                You are an expert {debug_lang} programmer and debugger.
-
-                TASK:
-                1. Detect all syntax and logical errors in the code below.
-                2. Explain every issue in simple terms.
-                3. Provide a fully corrected version of the code.
-
-                FORMAT STRICTLY:
-                ### Issues Found:
-                - [Issue 1]
-                - [Issue 2]
-
-                ### Explanation:
-                [Explanation text]
-
-                ### Fixed Code:
-                ```{debug_lang.lower()}
-                [Corrected code here]
-                ```
-
-                --- CODE TO DEBUG ---
-                {buggy_code}
-                """
-
-                response = gemini_model.generate_content(prompt)
-                
-                st.markdown("### 🔍 Debugging Report")
-                st.markdown(response.text)
-
-            except Exception as e:
-                st.error(f"Gemini Debugger Error: {str(e)}")
+        try:
+            prompt = f"""
+            You are an expert {debug_lang} programmer and debugger.
+
+            TASK:
+            1. Detect all syntax and logical errors in the code below.
+            2. Explain every issue in simple terms.
+            3. Provide a fully corrected version of the code.
+
+            FORMAT STRICTLY:
+            ### Issues Found:
+            - [Issue 1]
+            - [Issue 2]
+
+            ### Explanation:
+            [Explanation text]
+
+            ### Fixed Code:
+            ```{debug_lang.lower()}
+            [Corrected code here]
+            ```
+
+            --- CODE TO DEBUG ---
+            {buggy_code}
+            """
+
+            st.markdown("### 🔍 Debugging Report")
+            chunks = gemini_client.generate_stream(
+                prompt, model_name=MODEL, api_key=api_key, feature="coding_studio.debug",
+                charge=scheduler.Charge(get_user_id()),
+            )
+            stream_into(st.empty(), chunks)
+
+        except Exception as e:
+            st.error(f"Gemini Debugger Error: {str(e)}")
@@ -1,7 +1,8 @@
 import streamlit as st
-import google.generativeai as genai
 import re
-import datetime
+
+from utils import gemini_client, scheduler
+from utils.ui import get_user_id, show_estimated_wait, stream_into
 
 # ---------------------------
 # PAGE CONFIG
@@ -18,51 +19,26 @@ st.caption("Your personal AI-powered learning companion — choose explanation d
 # ---------------------------
 # CONSTANTS & USAGE LIMIT
 # ---------------------------
-DAILY_LIMIT = 50  # requests per user per day
-
-# ---------------------------
-# SESSION STATE INIT
-# ---------------------------
-if "usage_count" not in st.session_state:
-    st.session_state["usage_count"] = 0
-
-if "last_reset" not in st.session_state:
-    st.session_state["last_reset"] = str(datetime.date.today())
-
-# Auto reset daily
-today = str(datetime.date.today())
-if st.session_state["last_reset"] != today:
-    st.session_state["usage_count"] = 0
-    st.session_state["last_reset"] = today
+# Per-user token bucket shared by all of a student's tabs and pages (see utils/scheduler.py).
+# gemini_client charges it for each call that reaches the model.
+DAILY_LIMIT = scheduler.USER_REFILL_PER_DAY  # requests per user per day
 
-requests_left = DAILY_LIMIT - st.session_state["usage_count"]
+user_id = get_user_id()
+buckets = scheduler.user_buckets()
+requests_left = buckets.remaining(user_id)
 
 # ---------------------------
 # DISPLAY LIMIT
 # ---------------------------
 st.write(f"**Daily Usage Limit : `{DAILY_LIMIT}`**")
 st.info(f"📊 Requests Left Today: {requests_left}/{DAILY_LIMIT}")
-st.progress(min(st.session_state["usage_count"] / DAILY_LIMIT, 1.0))
+st.progress(min((DAILY_LIMIT - requests_left) / DAILY_LIMIT, 1.0))
 
 # ---------------------------
 # GEMINI INITIALIZATION
 # ---------------------------
-@st.cache_resource
-def init_gemini():
-    try:
-        key = st.secrets["GEMINI_API_KEY"]
-        genai.configure(api_key=key)
-
-        try:
-            return genai.GenerativeModel("gemini-2.5-pro")
-        except Exception:
-            st.warning("⚠️ Gemini 2.5 Flash not available. Switching to Gemini 2.0 Flash.")
-            return genai.GenerativeModel("gemini-2.0-flash")
-    except Exception as e:
-        st.error(f"Gemini initialization error: {e}")
-        return None
-
-gemini_model = init_gemini()
+MODEL = "gemini-2.5-pro"
+api_key = gemini_client.get_api_key()
 
 # ---------------------------
 # PROMPT BUILDER + LINK EXTRACTOR
@@ -114,22 +90,33 @@ include_links = st.checkbox("Include YouTube & web links (recommended)", value=T
 # GUARD: USAGE LIMIT
 # ---------------------------
 if requests_left <= 0:
-    st.error("🚫 Daily limit reached! You can ask more questions tomorrow.")
+    st.error("🚫 Daily limit reached! Your requests refill gradually through the day.")
     st.stop()
 
 # ---------------------------
 # CORE FUNCTION: CALL GEMINI
 # ---------------------------
-def get_explanation(topic_text: str, level_choice: str, include_links_flag: bool):
-    if not gemini_model:
+def get_explanation(topic_text: str, level_choice: str, include_links_flag: bool, placeholder=None):
+    """Ask Gemini for an explanation; streams it into `placeholder` when given."""
+    if not api_key:
         return {"error": "Gemini model not initialized."}
 
     prompt = build_prompt(topic_text, level_choice, request_youtube=include_links_flag)
+    charge = scheduler.Charge(user_id)
     try:
-        resp = gemini_model.generate_content(prompt)
-        raw = resp.text or ""
+        if placeholder is None:
+            raw = gemini_client.generate(
+                prompt, model_name=MODEL, api_key=api_key, feature="tutor.explain", charge=charge
+            )
+        else:
+            chunks = gemini_client.generate_stream(
+                prompt, model_name=MODEL, api_key=api_key, feature="tutor.explain", charge=charge
+            )
+            raw = stream_into(placeholder, chunks)
         links = extract_links(raw)
         return {"text": raw.strip(), "links": links}
+    except scheduler.RateLimited as e:
+        return {"error": f"🚫 Daily limit reached! Next request available in {scheduler.format_wait(e.retry_after)}."}
     except Exception as e:
         return {"error": str(e)}
 
@@ -140,24 +127,21 @@ if st.button("🧠 Explain Topic"):
     if not topic.strip():
         st.warning("Please enter a topic before clicking 'Explain Topic'.")
     else:
-        st.session_state["usage_count"] += 1
-        requests_left = DAILY_LIMIT - st.session_state["usage_count"]
-
-        with st.spinner("📚 Generating explanation..."):
-            result = get_explanation(topic, level, include_links)
+        show_estimated_wait(scheduler.INTERACTIVE)
+        st.markdown("---")
+        result = get_explanation(topic, level, include_links, st.empty())
 
         if result.get("error"):
             st.error(f"Error generating explanation: {result['error']}")
         else:
-            st.markdown("---")
-            st.markdown(result["text"])
+            requests_left = buckets.remaining(user_id)
             st.markdown("---")
             if result["links"]:
                 st.subheader("🔗 Links & Videos")
                 for u in result["links"]:
                     st.write(f"- [{u}]({u})")
-            st.success(f"✨ Request used! Remaining: {requests_left}/{DAILY_LIMIT}")
-            st.progress(min(st.session_state["usage_count"] / DAILY_LIMIT, 1.0))
+            st.success(f"✨ Done! Requests left today: {requests_left}/{DAILY_LIMIT} (cached answers are free)")
+            st.progress(min((DAILY_LIMIT - requests_left) / DAILY_LIMIT, 1.0))
 
 # ---------------------------
 # FOOTER
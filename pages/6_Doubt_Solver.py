@@ -1,11 +1,12 @@
 # pages/6_Doubt_Solver.py
 import streamlit as st
-import google.generativeai as genai
-import pdfplumber
 import os
 import datetime
 from PIL import Image
 
+from utils import card_gen, chat_view, gemini_client, memory, retrieval, scheduler, srs
+from utils.ui import extract_text_from_pdf, get_user_id, show_estimated_wait, stream_into
+
 # ---------------- Page config ----------------
 st.set_page_config(page_title="NexStudy Tutor", page_icon="🤖", layout="wide")
 st.markdown("<style>footer{visibility:hidden;} </style>", unsafe_allow_html=True)
@@ -19,25 +20,10 @@ st.title("🤖 NexStudy Tutor (Doubt Solver)")
 st.caption("Ask a question, upload a PDF or image, and get clear step-by-step explanations.")
 
 # ---------------- Gemini initialization ----------------
-@st.cache_resource
-def init_gemini():
-    key = None
-    try:
-        key = st.secrets["GEMINI_API_KEY"]
-    except Exception:
-        pass
-
-    if not key:
-        return None
-
-    try:
-        genai.configure(api_key=key)
-        return genai.GenerativeModel("gemini-2.0-flash")
-    except Exception as e:
-        st.error(f"Gemini initialization error: {e}")
-        return None
-
-gemini_model = init_gemini()
+MODEL = "gemini-2.0-flash"
+api_key = gemini_client.get_api_key()
+gemini_ready = api_key is not None
+user_id = get_user_id()
 
 # ---------------- Session state for chat ----------------
 if "messages" not in st.session_state:
@@ -46,32 +32,57 @@ if "messages" not in st.session_state:
 if "saved" not in st.session_state:
     st.session_state.saved = []
 
+# Earlier turns, recalled in each prompt at a bounded size
+if "memory" not in st.session_state:
+    st.session_state.memory = memory.Memory()
+
 # ---------------- Helpers ----------------
-def extract_text_from_pdf(uploaded_file):
-    try:
-        text = ""
-        with pdfplumber.open(uploaded_file) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n\n"
-        return text.strip()
-    except Exception as e:
-        st.error(f"Error extracting PDF text: {e}")
-        return ""
+def user_bubble(text):
+    user_text = text.replace('\n', '<br>')
+    return f"<div class='user'><b>You:</b><br>{user_text}</div>"
 
-# Modified to accept a list of contents (text + images)
-def call_gemini(contents):
-    if gemini_model is None:
+def ai_bubble(text):
+    ai_text_display = text.replace('\n', '<br>')
+    return f"<div class='ai'><b>NexStudy Tutor:</b><br>{ai_text_display}</div>"
+
+def render_ai_bubble(placeholder, text):
+    placeholder.markdown(ai_bubble(text), unsafe_allow_html=True)
+
+# Modified to accept a list of contents (text + images).
+# With a placeholder, the answer is streamed into it as it is generated.
+# `charge` is the request this turn costs the student (one per turn).
+def call_gemini(contents, placeholder=None, feature="chat", charge=None):
+    if not gemini_ready:
         return {"error": "Gemini API key not configured."}
+    charge = charge or scheduler.Charge(user_id)
     try:
         # Gemini accepts a list [text, image, text...]
-        resp = gemini_model.generate_content(contents)
-        text = resp.text or ""
+        if placeholder is None:
+            text = gemini_client.generate(
+                contents, model_name=MODEL, api_key=api_key, feature=f"doubt_solver.{feature}", charge=charge
+            )
+        else:
+            chunks = gemini_client.generate_stream(
+                contents, model_name=MODEL, api_key=api_key, feature=f"doubt_solver.{feature}", charge=charge
+            )
+            text = stream_into(placeholder, chunks, render=render_ai_bubble)
         return {"text": text}
     except Exception as e:
         return {"error": str(e)}
 
+# Flashcards go straight into the student's spaced-repetition deck.
+def make_cards(text, num_cards=5):
+    if not gemini_ready:
+        return {"error": "Gemini API key not configured."}
+    try:
+        deck = srs.cards().deck(user_id)
+        pairs = card_gen.generate_cards(
+            text, num_cards, MODEL, api_key, seen=deck.keys(), feature="doubt_solver.cards", user_id=user_id
+        )
+        return {"cards": deck.add(pairs)}
+    except Exception as e:
+        return {"error": str(e)}
+
 def append_user_message(text, meta=None):
     st.session_state.messages.append({"role": "user", "text": text, "meta": meta or {}})
 
@@ -90,6 +101,8 @@ with left:
 
     if st.button("Clear chat"):
         st.session_state.messages = []
+        st.session_state.memory = memory.Memory()
+        chat_view.reset()
         st.success("Chat cleared.")
         st.rerun()
         
@@ -128,48 +141,49 @@ with right:
         </style>
         """, unsafe_allow_html=True)
 
+    def render_message(msg):
+        if msg["role"] == "user":
+            st.markdown(chat_view.cached_html(msg, user_bubble), unsafe_allow_html=True)
+        else:
+            st.markdown(chat_view.cached_html(msg, ai_bubble), unsafe_allow_html=True)
+
+    # Buttons for AI response (each message's row reruns on its own)
+    def message_actions(i, msg):
+        cols = st.columns([1,1,1,1,1])
+
+        if cols[0].button(f"Explain Simpler 🔍", key=f"simpler_{i}"):
+            res = call_gemini([f"Explain this simpler:\n\n{msg['text']}"], st.empty(), "simpler")
+            if not res.get("error"):
+                append_assistant_message(res["text"])
+                st.rerun()
+
+        if cols[1].button(f"Show Steps 🪜", key=f"steps_{i}"):
+            res = call_gemini([f"Show step-by-step solution:\n\n{msg['text']}"], st.empty(), "steps")
+            if not res.get("error"):
+                append_assistant_message(res["text"])
+                st.rerun()
+
+        if cols[2].button(f"Generate Quiz 🎯", key=f"quiz_{i}"):
+            res = call_gemini([f"Create 5 MCQs from this:\n\n{msg['text']}"], st.empty(), "quiz")
+            if not res.get("error"):
+                append_assistant_message(res["text"])
+                st.rerun()
+
+        if cols[3].button(f"Flashcards 🧾", key=f"flash_{i}"):
+            with st.spinner("Writing flashcards..."):
+                res = make_cards(msg['text'])
+            if not res.get("error"):
+                append_assistant_message(card_gen.describe([(c.front, c.back) for c in res["cards"]]))
+                st.rerun()
+
+        if cols[4].button(f"Save 💾", key=f"save_{i}"):
+            st.session_state.saved.append({"title": msg["text"][:50]+"...", "text": msg["text"], "timestamp": str(datetime.datetime.now())})
+            st.success("Saved!")
+
     chat_box = st.container()
     with chat_box:
         st.markdown('<div class="chat-box">', unsafe_allow_html=True)
-        for i, msg in enumerate(st.session_state.messages):
-            if msg["role"] == "user":
-                user_text = msg['text'].replace('\n', '<br>')
-                st.markdown(f"<div class='user'><b>You:</b><br>{user_text}</div>", unsafe_allow_html=True)
-            else:
-                ai_text_display = msg['text'].replace('\n', '<br>')
-                st.markdown(f"<div class='ai'><b>NexStudy Tutor:</b><br>{ai_text_display}</div>", unsafe_allow_html=True)
-                
-                # Buttons for AI response
-                cols = st.columns([1,1,1,1,1])
-                
-                if cols[0].button(f"Explain Simpler 🔍", key=f"simpler_{i}"):
-                    res = call_gemini([f"Explain this simpler:\n\n{msg['text']}"])
-                    if not res.get("error"):
-                        append_assistant_message(res["text"])
-                        st.rerun()
-                        
-                if cols[1].button(f"Show Steps 🪜", key=f"steps_{i}"):
-                    res = call_gemini([f"Show step-by-step solution:\n\n{msg['text']}"])
-                    if not res.get("error"):
-                        append_assistant_message(res["text"])
-                        st.rerun()
-
-                if cols[2].button(f"Generate Quiz 🎯", key=f"quiz_{i}"):
-                    res = call_gemini([f"Create 5 MCQs from this:\n\n{msg['text']}"])
-                    if not res.get("error"):
-                        append_assistant_message(res["text"])
-                        st.rerun()
-                        
-                if cols[3].button(f"Flashcards 🧾", key=f"flash_{i}"):
-                    res = call_gemini([f"Create flashcards from this:\n\n{msg['text']}"])
-                    if not res.get("error"):
-                        append_assistant_message(res["text"])
-                        st.rerun()
-                        
-                if cols[4].button(f"Save 💾", key=f"save_{i}"):
-                    st.session_state.saved.append({"title": msg["text"][:50]+"...", "text": msg["text"], "timestamp": str(datetime.datetime.now())})
-                    st.success("Saved!")
-
+        chat_view.render_chat(st.session_state.messages, render_message, message_actions)
         st.markdown('</div>', unsafe_allow_html=True)
 
     st.markdown("---")
@@ -196,6 +210,7 @@ with right:
             # 1. System Preamble (Text)
             system_prompt = "You are NexStudy Tutor. Answer clearly. If the user sends an image, analyze it."
             request_content.append(system_prompt)
+            request_content.extend(st.session_state.memory.context(st.session_state.messages))
 
             # 2. User Text Input
             if user_input and user_input.strip():
@@ -204,9 +219,10 @@ with right:
 
             # 3. PDF Text
             if uploaded_pdf:
-                pdf_text = extract_text_from_pdf(uploaded_pdf)
+                pdf_text = extract_text_from_pdf(uploaded_pdf, feature="doubt_solver.pdf")
                 if pdf_text:
-                    request_content.append(f"PDF Context:\n{pdf_text}")
+                    # Only the parts relevant to the question, however long the PDF
+                    request_content.append(retrieval.context(pdf_text, user_input or ""))
                     display_text.append("[Uploaded PDF]")
 
             # 4. Image Input (The Key Fix)
@@ -224,14 +240,18 @@ with right:
                 # Show user message in chat
                 append_user_message("\n".join(display_text))
 
-                if gemini_model is None:
+                if not gemini_ready:
                     st.error("Gemini API Key missing.")
                 else:
-                    with st.spinner("Analyzing..."):
-                        res = call_gemini(request_content)
-                        
-                        if res.get("error"):
-                            st.error(res["error"])
-                        else:
-                            append_assistant_message(res["text"])
-                            st.rerun()
+                    show_estimated_wait()
+                    charge = scheduler.Charge(user_id)
+                    res = call_gemini(request_content, st.empty(), charge=charge)
+
+                    if res.get("error"):
+                        st.error(res["error"])
+                    else:
+                        append_assistant_message(res["text"])
+                        st.session_state.memory.update(
+                            st.session_state.messages, MODEL, api_key, "doubt_solver.memory", charge
+                        )
+                        st.rerun()
@@ -1,10 +1,11 @@
 import streamlit as st
-import google.generativeai as genai
-import pdfplumber
 import os
 import datetime
 from PIL import Image
 
+from utils import anki_export, card_gen, chat_view, gemini_client, memory, retrieval, scheduler, srs
+from utils.ui import extract_text_from_pdf, get_user_id
+
 # ---------------- Page config ----------------
 st.set_page_config(page_title="NexStudy Companion", page_icon="🤖", layout="wide")
 st.markdown("<style>footer{visibility:hidden;} </style>", unsafe_allow_html=True)
@@ -19,25 +20,7 @@ st.caption("""
 **Your all-in-one study companion:** Ask questions, upload homework for solutions, get concept explanations, or generate quizzes from your notes.
 """)
 
-# ---------------- Gemini Initialization (Robust) ----------------
-@st.cache_resource
-def init_gemini(api_key_input):
-    key = api_key_input
-    if not key:
-        try:
-            key = st.secrets.get("GEMINI_API_KEY")
-        except Exception:
-            pass
-    
-    if not key:
-        return None
-
-    try:
-        genai.configure(api_key=key)
-        return genai.GenerativeModel("gemini-2.0-flash")
-    except Exception as e:
-        st.error(f"Gemini initialization error: {e}")
-        return None
+MODEL = "gemini-2.0-flash"
 
 # ---------------- Sidebar for API Key ----------------
 with st.sidebar:
@@ -58,7 +41,8 @@ with st.sidebar:
     else:
         st.success("✅ API Key loaded from secrets")
 
-gemini_model = init_gemini(user_api_key)
+api_key = gemini_client.get_api_key(user_api_key)
+gemini_ready = api_key is not None
 
 # ---------------- Session State ----------------
 if "messages" not in st.session_state:
@@ -67,33 +51,53 @@ if "messages" not in st.session_state:
 if "saved" not in st.session_state:
     st.session_state.saved = []
 
+# Earlier turns, recalled in each prompt at a bounded size
+if "memory" not in st.session_state:
+    st.session_state.memory = memory.Memory()
+
 if "topic_explanation" not in st.session_state:
     st.session_state.topic_explanation = ""
 
+if "revealed_card" not in st.session_state:
+    st.session_state.revealed_card = None
+
+user_id = get_user_id()
+deck = srs.cards().deck(user_id)
+
 # ---------------- Helpers ----------------
-def extract_text_from_pdf(uploaded_file):
+def call_gemini(contents, feature="chat", charge=None):
+    if not gemini_ready:
+        return {"error": "Gemini API key not configured."}
+    charge = charge or scheduler.Charge(user_id)
     try:
-        text = ""
-        with pdfplumber.open(uploaded_file) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n\n"
-        return text.strip()
+        text = gemini_client.generate(
+            contents, model_name=MODEL, api_key=api_key, feature=f"flashcards.{feature}", charge=charge
+        )
+        return {"text": text}
     except Exception as e:
-        st.error(f"Error extracting PDF text: {e}")
-        return ""
+        return {"error": str(e)}
 
-def call_gemini(contents):
-    if gemini_model is None:
+def make_cards(text, num_cards=5, feature="cards"):
+    """Generate cards from `text` and add the new ones to the deck."""
+    if not gemini_ready:
         return {"error": "Gemini API key not configured."}
     try:
-        resp = gemini_model.generate_content(contents)
-        text = resp.text or ""
-        return {"text": text}
+        pairs = card_gen.generate_cards(
+            text, num_cards, MODEL, api_key, seen=deck.keys(), feature=f"flashcards.{feature}", user_id=user_id
+        )
+        return {"cards": deck.add(pairs)}
     except Exception as e:
         return {"error": str(e)}
 
+def user_box(text):
+    user_text = text.replace('\n', '<br>')
+    return f"""
+    <div style="background-color: #f0f2f6; padding: 15px; border-radius: 10px; margin-bottom: 15px; color: #000000;">
+        <h4 style="margin: 0 0 5px 0; color: #000000;">👤 You</h4>
+        {user_text}
+    </div>
+    """
+
 def append_user_message(text):
     st.session_state.messages.append({"role": "user", "text": text})
 
@@ -109,7 +113,7 @@ with left:
     st.markdown("### 🛠️ Study Mode")
     mode = st.radio(
         "Choose how you want to learn:", 
-        ["💬 Chat / Doubt Solver", "📖 Topic Explainer"], 
+        ["💬 Chat / Doubt Solver", "📖 Topic Explainer", "🎴 Review Deck"], 
         index=0
     )
     st.markdown("---")
@@ -132,6 +136,8 @@ with left:
         with col_a:
             if st.button("🗑️ Clear Chat"):
                 st.session_state.messages = []
+                st.session_state.memory = memory.Memory()
+                chat_view.reset()
                 st.rerun()
         with col_b:
             if st.button("💾 Saved Notes"):
@@ -170,9 +176,9 @@ with left:
                 
                 full_prompt = f"{prompt_text}\n{prompt_details}"
                 
-                if gemini_model:
+                if gemini_ready:
                     with st.spinner(f"Generating {explanation_level} explanation for '{topic_input}'..."):
-                        res = call_gemini([f"You are an expert tutor. {full_prompt}"])
+                        res = call_gemini([f"You are an expert tutor. {full_prompt}"], "topic")
                         if not res.get("error"):
                             # Save to a separate state variable, NOT the chat history
                             st.session_state.topic_explanation = res["text"]
@@ -182,6 +188,71 @@ with left:
                 else:
                     st.error("Gemini API Key missing.")
 
+    # ==========================================
+    # MODE 3: REVIEW DECK
+    # ==========================================
+    elif mode == "🎴 Review Deck":
+        st.markdown("#### 🎴 Your Deck")
+        deck_stats = st.container()  # filled in last, after any cards are added below
+        with st.form(key="add_card_form", clear_on_submit=True):
+            front = st.text_area("Front:", height=68, placeholder="e.g., What does DNA stand for?")
+            back = st.text_area("Back:", height=68, placeholder="e.g., Deoxyribonucleic acid")
+            if st.form_submit_button("➕ Add Card"):
+                if front.strip() and back.strip():
+                    deck.add([(front.strip(), back.strip())])
+                    st.success("Card added!")
+                else:
+                    st.warning("Please fill in both sides.")
+        st.caption("Tip: the **Cards** button under any chat answer adds cards here too.")
+
+        with st.expander("🏗️ Build a deck from notes"):
+            source_pdf = st.file_uploader("Upload a syllabus or chapter (PDF):", type=["pdf"], key="deck_pdf")
+            source_text = st.text_area("...or paste your notes:", height=120, key="deck_text")
+            num_cards = st.number_input("Number of cards:", min_value=5, max_value=1000, value=50, step=5)
+            if st.button("✨ Generate Cards", type="primary"):
+                text = extract_text_from_pdf(source_pdf, feature="flashcards.deck_pdf") if source_pdf else source_text
+                if not text.strip():
+                    st.warning("Please upload a PDF or paste some notes first.")
+                elif not gemini_ready:
+                    st.error("Gemini API Key missing.")
+                else:
+                    progress = st.progress(0.0, text="✨ Writing cards...")
+                    added, batch = 0, []
+                    try:
+                        cards_stream = card_gen.stream_cards(
+                            text, int(num_cards), MODEL, api_key, seen=deck.keys(), feature="flashcards.deck",
+                            user_id=user_id,
+                        )
+                        for pair in cards_stream:
+                            batch.append(pair)
+                            if len(batch) == 20:
+                                added += len(deck.add(batch))
+                                batch = []
+                                progress.progress(min(1.0, added / num_cards), text=f"✨ {added} cards added...")
+                    except Exception as e:
+                        st.error(str(e))
+                    added += len(deck.add(batch))
+                    progress.empty()
+                    st.success(f"Added {added} new card(s) to your deck.")
+
+        with st.expander("📦 Export for Anki"):
+            deck_name = st.text_input("Deck name:", value="NexStudy")
+            export_format = st.selectbox("Format:", list(anki_export.FORMATS), format_func=anki_export.FORMATS.get)
+            if st.button("📦 Prepare Export"):
+                st.session_state.deck_export = anki_export.export_file(
+                    lambda: srs.cards().iter_pairs(user_id), export_format, deck_name
+                )
+            export = st.session_state.get("deck_export")
+            if export and os.path.exists(export[0]):
+                path, file_name, rows = export
+                with open(path, "rb") as f:
+                    st.download_button(f"⬇️ Download {file_name} ({rows} cards)", f, file_name=file_name)
+
+        due = deck.due_count()
+        c1, c2 = deck_stats.columns(2)
+        c1.metric("Cards", len(deck))
+        c2.metric("Due now", f"{due}+" if due >= 999 else due)
+
 # ---------------- RIGHT COLUMN: Output ----------------
 with right:
     
@@ -190,61 +261,55 @@ with right:
     # ==========================================
     if mode == "💬 Chat / Doubt Solver":
         
+        def render_message(msg):
+            # Render User Message (IN GREY BOX)
+            if msg["role"] == "user":
+                st.markdown(chat_view.cached_html(msg, user_box), unsafe_allow_html=True)
+
+            # Render AI Message (Simple Header + Text)
+            else:
+                st.markdown(f"### 🤖 NexStudy AI")
+                st.markdown(msg['text'])
+
+        # --- Action Buttons (Study Tools) ---
+        # Buttons appear directly below the text, clean style; each row reruns on its own
+        def message_actions(i, msg):
+            b1, b2, b3, b4, b5 = st.columns([1,1,1,1,1])
+
+            if b1.button(f"Simplify", key=f"simp_{i}", help="Explain like I'm 5"):
+                res = call_gemini([f"Explain this response in much simpler terms with an analogy:\n\n{msg['text']}"], "simpler")
+                if not res.get("error"):
+                    append_assistant_message(res["text"])
+                    st.rerun()
+
+            if b2.button(f"Steps", key=f"step_{i}", help="Show step-by-step solution"):
+                res = call_gemini([f"Break this down into clear, numbered steps:\n\n{msg['text']}"], "steps")
+                if not res.get("error"):
+                    append_assistant_message(res["text"])
+                    st.rerun()
+
+            if b3.button(f"Quiz", key=f"quiz_{i}", help="Generate a quiz based on this"):
+                res = call_gemini([f"Create 3 Multiple Choice Questions (with answers at the end) to test my understanding of this:\n\n{msg['text']}"], "quiz")
+                if not res.get("error"):
+                    append_assistant_message(res["text"])
+                    st.rerun()
+
+            if b4.button(f"Cards", key=f"card_{i}", help="Make flashcards"):
+                res = make_cards(msg['text'])
+                if not res.get("error"):
+                    append_assistant_message(card_gen.describe([(c.front, c.back) for c in res["cards"]]))
+                    st.rerun()
+
+            if b5.button(f"Save", key=f"sav_{i}"):
+                st.session_state.saved.append({"text": msg["text"], "timestamp": str(datetime.datetime.now().strftime("%Y-%m-%d %H:%M"))})
+                st.success("Saved!")
+
+            # Divider to separate message pairs or conversation turns
+            st.divider()
+
         chat_container = st.container()
         with chat_container:
-            for i, msg in enumerate(st.session_state.messages):
-                # Render User Message (IN GREY BOX)
-                if msg["role"] == "user":
-                    user_text = msg['text'].replace('\n', '<br>')
-                    st.markdown(
-                        f"""
-                        <div style="background-color: #f0f2f6; padding: 15px; border-radius: 10px; margin-bottom: 15px; color: #000000;">
-                            <h4 style="margin: 0 0 5px 0; color: #000000;">👤 You</h4>
-                            {user_text}
-                        </div>
-                        """, 
-                        unsafe_allow_html=True
-                    )
-                
-                # Render AI Message (Simple Header + Text)
-                else:
-                    st.markdown(f"### 🤖 NexStudy AI")
-                    st.markdown(msg['text'])
-                    
-                    # --- Action Buttons (Study Tools) ---
-                    # Buttons appear directly below the text, clean style
-                    b1, b2, b3, b4, b5 = st.columns([1,1,1,1,1])
-                    
-                    if b1.button(f"Simplify", key=f"simp_{i}", help="Explain like I'm 5"):
-                        res = call_gemini([f"Explain this response in much simpler terms with an analogy:\n\n{msg['text']}"])
-                        if not res.get("error"):
-                            append_assistant_message(res["text"])
-                            st.rerun()
-                            
-                    if b2.button(f"Steps", key=f"step_{i}", help="Show step-by-step solution"):
-                        res = call_gemini([f"Break this down into clear, numbered steps:\n\n{msg['text']}"])
-                        if not res.get("error"):
-                            append_assistant_message(res["text"])
-                            st.rerun()
-
-                    if b3.button(f"Quiz", key=f"quiz_{i}", help="Generate a quiz based on this"):
-                        res = call_gemini([f"Create 3 Multiple Choice Questions (with answers at the end) to test my understanding of this:\n\n{msg['text']}"])
-                        if not res.get("error"):
-                            append_assistant_message(res["text"])
-                            st.rerun()
-                            
-                    if b4.button(f"Cards", key=f"card_{i}", help="Make flashcards"):
-                        res = call_gemini([f"Create 5 Flashcards (Front/Back format) from this content:\n\n{msg['text']}"])
-                        if not res.get("error"):
-                            append_assistant_message(res["text"])
-                            st.rerun()
-                            
-                    if b5.button(f"Save", key=f"sav_{i}"):
-                        st.session_state.saved.append({"text": msg["text"], "timestamp": str(datetime.datetime.now().strftime("%Y-%m-%d %H:%M"))})
-                        st.success("Saved!")
-                    
-                    # Divider to separate message pairs or conversation turns
-                    st.divider()
+            chat_view.render_chat(st.session_state.messages, render_message, message_actions)
 
         # ---------------- CHAT INPUT FORM ----------------
         # Using a container at the bottom to keep input separate
@@ -276,15 +341,17 @@ with right:
 
                 system_prompt = "You are NexStudy AI. Answer concisely but helpful."
                 content_parts.append(system_prompt)
+                content_parts.extend(st.session_state.memory.context(st.session_state.messages))
 
                 if user_input and user_input.strip():
                     content_parts.append(user_input)
                     display_text.append(user_input)
 
                 if uploaded_pdf:
-                    pdf_text = extract_text_from_pdf(uploaded_pdf)
+                    pdf_text = extract_text_from_pdf(uploaded_pdf, feature="flashcards.pdf")
                     if pdf_text:
-                        content_parts.append(f"Context from uploaded PDF:\n{pdf_text}")
+                        # Only the parts relevant to the question, however long the PDF
+                        content_parts.append(retrieval.context(pdf_text, user_input or ""))
                         display_text.append(f"📄 [Attached PDF: {uploaded_pdf.name}]")
                 
                 if uploaded_image:
@@ -299,11 +366,15 @@ with right:
                     st.warning("Please type a message.")
                 else:
                     append_user_message("\n".join(display_text))
-                    if gemini_model:
+                    if gemini_ready:
                         with st.spinner("Thinking..."):
-                            res = call_gemini(content_parts)
+                            charge = scheduler.Charge(user_id)
+                            res = call_gemini(content_parts, charge=charge)
                             if not res.get("error"):
                                 append_assistant_message(res["text"])
+                                st.session_state.memory.update(
+                                    st.session_state.messages, MODEL, api_key, "flashcards.memory", charge
+                                )
                                 st.rerun()
     
     # ==========================================
@@ -330,3 +401,34 @@ with right:
             - Key takeaways 🗝️
             - Useful references 🔗
             """)
+
+    # ==========================================
+    # VIEW 3: FLASHCARD REVIEW
+    # ==========================================
+    elif mode == "🎴 Review Deck":
+        card = deck.next_due()
+        if card is None:
+            st.success("🎉 All caught up! No cards are due right now.")
+            next_at = deck.next_review_at()
+            if next_at:
+                st.caption(f"Next review: {datetime.datetime.fromtimestamp(next_at).strftime('%Y-%m-%d %H:%M')}")
+            else:
+                st.info("👈 Your deck is empty. Add cards on the left or with the **Cards** button in the chat.")
+        else:
+            st.markdown("### ❓ Question")
+            st.markdown(card.front)
+            if st.session_state.revealed_card != card.id:
+                if st.button("👀 Show Answer", type="primary"):
+                    st.session_state.revealed_card = card.id
+                    st.rerun()
+            else:
+                st.markdown("---")
+                st.markdown("### 💡 Answer")
+                st.markdown(card.back)
+                st.markdown("---")
+                st.write("How well did you remember it?")
+                for col, label in zip(st.columns(len(srs.GRADES)), srs.GRADES):
+                    if col.button(label, key=f"grade_{label}", use_container_width=True):
+                        deck.grade(card.id, srs.GRADES[label])
+                        st.session_state.revealed_card = None
+                        st.rerun()
@@ -0,0 +1 @@
+"""Shared helpers used across the NexStudy pages."""
@@ -0,0 +1,101 @@
+"""Streaming flashcard export in Anki's text import format.
+
+Cards are written row by row from any iterable of (front, back) pairs, so
+exporting a deck of any size holds one row in memory at a time:
+
+- `write_delimited` writes TSV or CSV with Anki's file headers
+  (`#separator`, `#html`, `#deck`, `#columns`), which Anki 2.1.55+ reads
+  without any import settings; older versions skip them as comments.
+- `write_bundle` streams the TSV and CSV into one deflated zip, for
+  handing out large decks.
+- `export_file` writes either into `<CACHE_DIR>/exports` and returns the
+  path, ready for `st.download_button(open(path, "rb"))`.
+
+Fields are HTML-escaped with newlines as `<br>`, since Anki treats imported
+fields as HTML.
+"""
+import csv
+import html
+import io
+import os
+import re
+import tempfile
+import zipfile
+
+from utils.disk_cache import CACHE_DIR
+
+FORMATS = {"tsv": "Anki text (.txt, tab-separated)", "csv": "CSV (.csv)", "zip": "Zip bundle (.zip)"}
+EXPORT_DIR = os.path.join(CACHE_DIR, "exports")
+KEEP_EXPORTS = 20  # older export files are deleted when a new one is written
+
+_UNSAFE_NAME = re.compile(r"[^\w\- ]+")
+
+
+def _field(text):
+    return html.escape(text.strip(), quote=False).replace("\r\n", "\n").replace("\n", "<br>")
+
+
+def write_delimited(pairs, out, fmt="tsv", deck_name="NexStudy"):
+    """Write (front, back) pairs to the text stream `out`; returns the row count."""
+    delimiter, separator = ("\t", "Tab") if fmt == "tsv" else (",", "Comma")
+    deck_name = " ".join(deck_name.split())
+    out.write(f"#separator:{separator}\n#html:true\n#notetype:Basic\n#deck:{deck_name}\n")
+    out.write(f"#columns:Front{delimiter}Back\n")
+    writer = csv.writer(out, delimiter=delimiter, lineterminator="\n")
+    rows = 0
+    for front, back in pairs:
+        writer.writerow((_field(front), _field(back)))
+        rows += 1
+    return rows
+
+
+def write_bundle(pairs_factory, out, deck_name="NexStudy"):
+    """Stream a zip with the deck as TSV and CSV into the binary stream `out`.
+
+    `pairs_factory()` is called once per file and must return a fresh
+    iterable of (front, back) pairs. Returns the row count.
+    """
+    base = safe_name(deck_name)
+    rows = 0
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for fmt, ext in (("tsv", "txt"), ("csv", "csv")):
+            with zf.open(f"{base}.{ext}", "w", force_zip64=True) as raw:
+                with io.TextIOWrapper(raw, encoding="utf-8", newline="") as text:
+                    rows = write_delimited(pairs_factory(), text, fmt, deck_name)
+        zf.writestr("README.txt", (
+            f"{deck_name}: {rows} flashcards.\n\n"
+            "Anki: File > Import, then pick the .txt file. Its first lines set the deck and note type.\n"
+            "Other apps (Quizlet, spreadsheets): use the .csv file.\n"
+        ))
+    return rows
+
+
+def safe_name(deck_name):
+    return _UNSAFE_NAME.sub("", deck_name).strip().replace(" ", "_") or "flashcards"
+
+
+def _prune():
+    try:
+        files = sorted((os.path.join(EXPORT_DIR, f) for f in os.listdir(EXPORT_DIR)), key=os.path.getmtime)
+    except OSError:
+        return
+    for path in files[:-KEEP_EXPORTS]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def export_file(pairs_factory, fmt="tsv", deck_name="NexStudy"):
+    """Write an export in `fmt` (a key of FORMATS) to disk; returns (path, file name, rows)."""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    _prune()
+    ext = {"tsv": "txt", "csv": "csv", "zip": "zip"}[fmt]
+    fd, path = tempfile.mkstemp(suffix=f".{ext}", dir=EXPORT_DIR)
+    with os.fdopen(fd, "wb") as out:
+        if fmt == "zip":
+            rows = write_bundle(pairs_factory, out, deck_name)
+        else:
+            with io.TextIOWrapper(out, encoding="utf-8", newline="") as text:
+                rows = write_delimited(pairs_factory(), text, fmt, deck_name)
+    return path, f"{safe_name(deck_name)}.{ext}", rows
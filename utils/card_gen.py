@@ -0,0 +1,125 @@
+"""Flashcard generation as structured JSON.
+
+The model is asked for {"cards": [{"front", "back"}]} and the answer is
+streamed through the incremental JSON parser (utils/json_stream.py), so
+cards are validated one by one as they arrive. Long sources (a syllabus, a
+textbook chapter) are split into chunks that are asked for cards
+concurrently and balanced across the source (utils/fan_out.py).
+
+Cards whose front matches one already seen, in this batch or in the
+student's deck (`srs.card_key`), are dropped before they reach the deck.
+"""
+from utils import fan_out, gemini_client, scheduler
+from utils.chunking import estimate_tokens, split_into_chunks
+from utils.json_stream import JsonArrayStream
+from utils.srs import card_key
+
+SINGLE_CALL_MAX = 20   # cards a single prompt reliably returns
+CHUNK_TOKENS = 2500
+MAX_WORKERS = 6
+OVERSAMPLE = 1.2       # ask for extra so de-duplication doesn't leave gaps
+MAX_FRONT = 500        # characters; longer "fronts" are whole paragraphs, not questions
+MAX_BACK = 2000
+
+CARDS_PROMPT = """
+You are an expert flashcard writer.
+Write exactly {num_cards} flashcards from the text below.
+
+TEXT:
+{text}
+
+INSTRUCTIONS:
+- Output MUST be valid JSON only.
+- NO markdown.
+- NO commentary.
+- JSON must have a top-level key "cards".
+- Each card must include:
+    "front": string (one question or term, answerable from the back alone)
+    "back": string (a short, self-contained answer)
+- Do not repeat a card.
+
+RETURN ONLY THIS FORMAT:
+{{
+  "cards": [
+    {{
+      "front": "...",
+      "back": "..."
+    }}
+  ]
+}}
+"""
+
+
+def is_valid(card):
+    """True for a card with a non-empty front and back of sensible length."""
+    if not isinstance(card, dict):
+        return False
+    front, back = card.get("front"), card.get("back")
+    return (isinstance(front, str) and isinstance(back, str)
+            and 0 < len(front.strip()) <= MAX_FRONT and 0 < len(back.strip()) <= MAX_BACK
+            and card_key(front) != card_key(back))
+
+
+def _ask(text, count, model_name, api_key, charge, feature, priority):
+    prompt = CARDS_PROMPT.format(num_cards=count, text=text)
+    parser = JsonArrayStream("cards")
+    chunks = gemini_client.generate_stream(
+        prompt, model_name=model_name, api_key=api_key, priority=priority, feature=feature, charge=charge
+    )
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+
+
+def stream_cards(text, num_cards=5, model_name=gemini_client.DEFAULT_MODEL, api_key=None,
+                 seen=None, feature="cards", user_id=None):
+    """Yield up to `num_cards` validated (front, back) pairs as they arrive.
+
+    `seen` is a container of `card_key`s to skip, e.g. a deck's `keys()`;
+    it is not modified. In a chunked run a failing chunk is skipped (but
+    scheduler.RateLimited is raised); a single-call run raises after the
+    cards that came before the error. The whole run costs `user_id` one
+    request (see scheduler.Charge).
+    """
+    charge = scheduler.Charge(user_id)
+    taken = set()
+
+    def fresh(card):
+        if not is_valid(card):
+            return None
+        key = card_key(card["front"])
+        if key in taken or (seen is not None and key in seen):
+            return None
+        taken.add(key)
+        return card["front"].strip(), card["back"].strip()
+
+    if num_cards <= SINGLE_CALL_MAX and estimate_tokens(text) <= CHUNK_TOKENS * 2:
+        count = 0
+        for card in _ask(text, num_cards, model_name, api_key, charge, f"{feature}.generate", scheduler.INTERACTIVE):
+            pair = fresh(card)
+            if pair:
+                yield pair
+                count += 1
+                if count == num_cards:
+                    return
+        return
+
+    yield from fan_out.gather(
+        split_into_chunks(text, CHUNK_TOKENS), num_cards,
+        lambda chunk, quota: _ask(chunk, quota, model_name, api_key, charge, f"{feature}.chunk", scheduler.BULK),
+        fresh, OVERSAMPLE, MAX_WORKERS,
+    )
+
+
+def generate_cards(text, num_cards=5, model_name=gemini_client.DEFAULT_MODEL, api_key=None,
+                   seen=None, feature="cards", user_id=None):
+    """Return up to `num_cards` validated, de-duplicated (front, back) pairs from `text`."""
+    return list(stream_cards(text, num_cards, model_name, api_key, seen, feature, user_id))
+
+
+def describe(pairs):
+    """Chat message listing newly added cards."""
+    if not pairs:
+        return "🎴 No new flashcards: every card was invalid or already in your deck."
+    lines = [f"🎴 Added {len(pairs)} new flashcard(s) to your deck:", ""]
+    lines += [f"{i}. {front}\n   ↳ {back}" for i, (front, back) in enumerate(pairs, 1)]
+    return "\n".join(lines)
@@ -0,0 +1,120 @@
+"""Dashboard progress charts, rendered once per data version.
+
+A student's daily rollups (utils/results_store.py) are loaded into
+columnar NumPy arrays once per data version, i.e. their attempt count,
+which only grows. Every time range is a slice of those arrays, and each
+rendered PNG is kept in a small LRU keyed by (user, version, range, day),
+so a rerun with no new quiz results costs a dictionary lookup.
+
+Figures are built with matplotlib's object API (`Figure`), not the global
+`pyplot` state, so concurrent sessions never share or leak figures.
+"""
+import datetime
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+RANGES = {"7 days": 7, "30 days": 30, "All time": None}
+WEEKLY_AFTER = 60      # days of history beyond which "All time" is drawn per week
+MAX_IMAGES = 128
+MAX_SERIES = 512
+
+_lock = threading.Lock()
+_series = OrderedDict()  # user_id -> (version, days, attempts, score_sum)
+_images = OrderedDict()  # (user_id, version, range, today) -> PNG bytes
+
+
+def _load(store, user_id, version):
+    """Columnar daily series for a user, rebuilt only when `version` changes."""
+    with _lock:
+        cached = _series.get(user_id)
+    if cached and cached[0] == version:
+        return cached[1:]
+    rows = store.daily(user_id)
+    days = np.array([r[0] for r in rows], dtype="datetime64[D]")
+    attempts = np.array([r[1] for r in rows], dtype=np.int64)
+    score_sum = np.array([r[2] for r in rows], dtype=np.float64) * attempts
+    with _lock:
+        _series[user_id] = (version, days, attempts, score_sum)
+        _series.move_to_end(user_id)
+        while len(_series) > MAX_SERIES:
+            _series.popitem(last=False)
+    return days, attempts, score_sum
+
+
+def series(store, user_id, version, range_label, today=None):
+    """(x, attempts, accuracy, bar width in days) for a range.
+
+    Accuracy is NaN where no quiz was taken.
+
+    7 and 30 days are dense per-day calendars ending today; "All time" is
+    per day, or per week once the history is longer than WEEKLY_AFTER days.
+    """
+    days, attempts, score_sum = _load(store, user_id, version)
+    span = RANGES[range_label]
+    # Local dates, like the rollups in utils/results_store.py.
+    today = np.datetime64(today or datetime.date.today(), "D")
+
+    if span is not None:
+        start = today - (span - 1)
+        first = np.searchsorted(days, start)
+        index = (days[first:] - start).astype(np.int64)
+        x = start + np.arange(span)
+        width = 1
+        counts = np.bincount(index, weights=attempts[first:], minlength=span)
+        sums = np.bincount(index, weights=score_sum[first:], minlength=span)
+    elif len(days) and (days[-1] - days[0]).astype(np.int64) > WEEKLY_AFTER:
+        week = ((days - days[0]).astype(np.int64)) // 7
+        x = days[0] + 7 * np.arange(week[-1] + 1)
+        width = 7
+        counts = np.bincount(week, weights=attempts)
+        sums = np.bincount(week, weights=score_sum)
+    else:
+        x, counts, sums = days, attempts.astype(np.float64), score_sum
+        width = 1
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        accuracy = np.where(counts > 0, sums / counts, np.nan)
+    return x, counts, accuracy, width
+
+
+def _render(x, counts, accuracy, width, title):
+    from matplotlib.figure import Figure  # slow to import; only needed for a chart not yet cached
+
+    fig = Figure(figsize=(6, 3), dpi=100)
+    ax = fig.subplots()
+    ax.bar(x, counts, width=0.8 * width, color="#d6e4ff", label="Quizzes")
+    ax.set_ylabel("Quizzes")
+    ax.yaxis.get_major_locator().set_params(integer=True)
+    acc = ax.twinx()
+    acc.plot(x, accuracy, marker="o", color="#3366cc", label="Accuracy")
+    acc.set_ylim(0, 105)
+    acc.set_ylabel("Score (%)")
+    ax.set_title(title)
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def progress_chart(store, user_id, version, range_label):
+    """PNG bytes of a student's progress over `range_label` (a key of RANGES)."""
+    today = datetime.date.today()  # the 7/30-day windows move at midnight
+    key = (user_id, version, range_label, str(today))
+    with _lock:
+        png = _images.get(key)
+        if png is not None:
+            _images.move_to_end(key)
+            return png
+
+    x, counts, accuracy, width = series(store, user_id, version, range_label, today)
+    title = "Learning Progress" if RANGES[range_label] is None else f"Learning Progress, last {range_label}"
+    png = _render(x, counts, accuracy, width, title)
+    with _lock:
+        _images[key] = png
+        while len(_images) > MAX_IMAGES:
+            _images.popitem(last=False)
+    return png
@@ -0,0 +1,54 @@
+"""Chat history rendering that stays fast as a conversation grows.
+
+- Only the last `window` messages are drawn; a "Load older messages" button
+  pages further back, `window` at a time.
+- A message's HTML is built once and kept on the message dict (`"html"`),
+  so reruns don't re-escape and re-format every answer.
+- Each message's action buttons run in their own `st.fragment`: a click
+  reruns just that message's buttons, not the page, unless the action
+  calls `st.rerun()` (e.g. to show a new message), which reruns the app.
+"""
+import streamlit as st
+
+WINDOW = 20
+
+
+def cached_html(msg, build):
+    """`build(msg["text"])`, computed once per message."""
+    html = msg.get("html")
+    if html is None:
+        html = msg["html"] = build(msg["text"])
+    return html
+
+
+def reset(key="chat"):
+    """Forget how far back the user has paged, e.g. after clearing the chat."""
+    st.session_state.pop(f"{key}_shown", None)
+
+
+def _show_older(key, window):
+    st.session_state[f"{key}_shown"] = st.session_state.get(f"{key}_shown", window) + window
+
+
+@st.fragment
+def _actions(actions, i, msg):
+    actions(i, msg)
+
+
+def render_chat(messages, render_message, actions=None, window=WINDOW, key="chat"):
+    """Draw the most recent messages.
+
+    `render_message(msg)` draws one message. `actions(i, msg)` draws the
+    buttons under assistant message `i` (its index in `messages`) and runs
+    as a fragment.
+    """
+    shown = st.session_state.get(f"{key}_shown", window)
+    start = max(0, len(messages) - shown)
+    if start:
+        st.button(f"⬆️ Load older messages ({start} hidden)", key=f"{key}_older",
+                  on_click=_show_older, args=(key, window))
+    for i in range(start, len(messages)):
+        msg = messages[i]
+        render_message(msg)
+        if actions is not None and msg["role"] == "assistant":
+            _actions(actions, i, msg)
@@ -0,0 +1,81 @@
+"""Token estimation and boundary-aware text chunking.
+
+Gemini's tokenizer isn't available offline, so sizes are estimated locally
+(about four characters per token for English prose), which is close enough
+for budgeting prompts.
+
+Chunk boundaries are content-defined: whether a chunk ends after a
+paragraph depends on a hash of that paragraph, not on how much text came
+before it. An edit therefore changes only the chunk it falls in (and at
+worst its neighbour), so cached chunk answers stay valid for the rest of
+the document.
+"""
+import re
+import zlib
+
+CHARS_PER_TOKEN = 4
+MIN_FILL = 0.5      # a chunk never ends on a hash before it is this full
+TARGET_FILL = 0.25  # mean extra fill past MIN_FILL before a hash boundary
+
+_HEADING = re.compile(r"^(#{1,6}\s|[A-Z][A-Z0-9 ,:&-]{3,}$|(?i:chapter|section|unit)\b|\d+(\.\d+)*[.)]?\s+[A-Z])")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text):
+    """Rough token count for `text`."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _split_oversized(block, max_chars):
+    """Split one block that is too big on its own: sentences first, then hard cuts."""
+    pieces, current = [], ""
+    for sentence in _SENTENCE_END.split(block):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _is_boundary(block, max_chars):
+    """Content-defined cut after `block`, more likely the longer it is."""
+    return zlib.crc32(block.encode()) / 2**32 < len(block) / (max_chars * TARGET_FILL)
+
+
+def split_into_chunks(text, max_tokens):
+    """Split `text` into chunks of at most `max_tokens` (estimated).
+
+    Paragraphs are kept whole. Once a chunk is MIN_FILL full it ends after
+    any paragraph whose hash says so (see _is_boundary), before a section
+    heading, or when the next paragraph wouldn't fit, so chunks follow the
+    document's own structure and an edit only changes the chunk it is in.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    min_chars = int(max_chars * MIN_FILL)
+    blocks = [b.strip() for b in re.split(r"\n\s*\n", text) if b.strip()]
+
+    chunks, current, size = [], [], 0
+    for block in blocks:
+        is_heading = bool(_HEADING.match(block.splitlines()[0].strip()))
+        if current and (size + len(block) > max_chars or (is_heading and size > min_chars)):
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        if len(block) > max_chars:
+            chunks.extend(_split_oversized(block, max_chars))
+            continue
+        current.append(block)
+        size += len(block) + 2
+        if size >= min_chars and _is_boundary(block, max_chars):
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
@@ -0,0 +1,153 @@
+"""Small persistent key/value cache backed by SQLite.
+
+Shared by every Streamlit session and worker process on the machine. Entries
+carry their size and last-access time so the file can be kept under a byte
+budget by evicting the least recently used rows, and an optional expiry time
+for caches whose contents go stale.
+
+The total size is kept in a `meta` row by triggers, so a write doesn't have
+to sum the table, and last-access times are only rewritten once they are
+TOUCH_INTERVAL old, so reading a hot entry doesn't take a write lock.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = os.environ.get(
+    "NEXSTUDY_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache"),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries(last_access);
+"""
+
+# Created in one transaction, so the running total starts from an exact sum
+# of whatever the file already holds.
+_SIZE_TRACKING = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta VALUES ('bytes', (SELECT COALESCE(SUM(size), 0) FROM entries));
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    UPDATE meta SET value = value + NEW.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE meta SET value = value - OLD.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS entries_resize AFTER UPDATE OF size ON entries BEGIN
+    UPDATE meta SET value = value + NEW.size - OLD.size WHERE name = 'bytes';
+END;
+COMMIT;
+"""
+
+_BATCH = 500          # keys per IN (...) query
+TOUCH_INTERVAL = 60   # seconds; LRU order is only kept to this resolution
+
+
+class DiskCache:
+    """String cache in `<CACHE_DIR>/<name>.sqlite3`, bounded to `max_bytes`.
+
+    With `ttl` (seconds) set, entries stop being returned once they are
+    older than that and are purged on the next write.
+    """
+
+    def __init__(self, name, max_bytes, ttl=None):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.path = os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+            if "expires_at" not in columns:  # cache files written before TTL support
+                conn.execute("ALTER TABLE entries ADD COLUMN expires_at REAL")
+        self._conn().executescript(_SIZE_TRACKING)
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads; keep one each.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """Return {key: value} for the keys that are present."""
+        found = {}
+        stale = []  # hits whose last_access is older than TOUCH_INTERVAL
+        conn = self._conn()
+        now = time.time()
+        for i in range(0, len(keys), _BATCH):
+            batch = keys[i:i + _BATCH]
+            marks = ",".join("?" * len(batch))
+            for key, value, last_access in conn.execute(
+                f"SELECT key, value, last_access FROM entries WHERE key IN ({marks})"
+                " AND (expires_at IS NULL OR expires_at > ?)",
+                [*batch, now],
+            ):
+                found[key] = value
+                if last_access < now - TOUCH_INTERVAL:
+                    stale.append(key)
+        if stale:
+            with conn:
+                for i in range(0, len(stale), _BATCH):
+                    batch = stale[i:i + _BATCH]
+                    conn.execute(
+                        f"UPDATE entries SET last_access = ? WHERE key IN ({','.join('?' * len(batch))})",
+                        [now, *batch],
+                    )
+        return found
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, items):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        rows = [(k, v, len(v.encode("utf-8")), now, expires_at) for k, v in items.items()]
+        conn = self._conn()
+        with conn:
+            # An upsert rather than INSERT OR REPLACE: REPLACE's implicit delete
+            # wouldn't fire the size trigger.
+            conn.executemany(
+                "INSERT INTO entries (key, value, size, last_access, expires_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size,"
+                " last_access = excluded.last_access, expires_at = excluded.expires_at",
+                rows,
+            )
+            self._evict(conn, now)
+
+    def delete(self, key):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _evict(self, conn, now):
+        """Drop expired rows, then least recently used ones until under max_bytes."""
+        if self.ttl:
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        total = conn.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access"):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
@@ -0,0 +1,188 @@
+"""Offline stand-in for the Gemini backend.
+
+Implements the slice of `GenerativeModel.generate_content` the app uses
+(plain and streamed calls, `.text`, `usage_metadata`) with configurable
+latency, chunked streaming, error injection and canned structured answers,
+so every page can run without a key or network and the app's own overhead
+can be measured apart from upstream latency.
+
+Select it with GEMINI_BACKEND = "fake" in .streamlit/secrets.toml or the
+environment. Tuning settings (secrets or environment):
+
+    FAKE_GEMINI_LATENCY     "fixed:0.5", "uniform:0.2,1.5" or "lognormal:-0.5,0.6" (seconds)
+    FAKE_GEMINI_CHUNKS      number of chunks a streamed answer is split into
+    FAKE_GEMINI_ERROR_RATE  probability (0-1) that a call fails
+    FAKE_GEMINI_ERRORS      comma list of errors to inject: unavailable, quota, internal, timeout
+    FAKE_GEMINI_SEED        seed for latencies and injected errors
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+from google.api_core import exceptions as api_exceptions
+
+_ERRORS = {
+    "unavailable": lambda: api_exceptions.ServiceUnavailable("The model is overloaded (fake)."),
+    "quota": lambda: api_exceptions.ResourceExhausted("Quota exceeded (fake)."),
+    "internal": lambda: api_exceptions.InternalServerError("Internal error (fake)."),
+    "timeout": lambda: api_exceptions.DeadlineExceeded("Deadline exceeded (fake)."),
+}
+_WORD = re.compile(r"[A-Za-z][A-Za-z-]{3,}")
+_SENTENCE = re.compile(r"[^.!?\n]{30,}[.!?]")
+
+
+def parse_latency(spec):
+    """Turn a latency spec into a sampler taking a random.Random."""
+    kind, _, args = str(spec).partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()] if args else []
+    if kind == "uniform":
+        low, high = values
+        return lambda rng: rng.uniform(low, high)
+    if kind == "lognormal":
+        mu, sigma = values
+        return lambda rng: rng.lognormvariate(mu, sigma)
+    if kind == "fixed":
+        return lambda rng: values[0]
+    return lambda rng: float(kind)  # a bare number of seconds
+
+
+class _Usage:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class FakeResponse:
+    def __init__(self, text, usage):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class FakeModel:
+    """Drop-in for genai.GenerativeModel backed by canned answers."""
+
+    def __init__(self, model_name, latency="fixed:0.3", chunks=8, error_rate=0.0,
+                 errors="unavailable", seed=0):
+        self.model_name = model_name
+        self._latency = parse_latency(latency)
+        self.chunks = max(1, int(chunks))
+        self.error_rate = float(error_rate)
+        self.errors = [e.strip() for e in str(errors).split(",") if e.strip() in _ERRORS]
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        with self._lock:
+            delay = max(0.0, self._latency(self._rng))
+            fail = self.errors and self._rng.random() < self.error_rate
+            error = self._rng.choice(self.errors) if fail else None
+        return delay, error
+
+    def generate_content(self, contents, stream=False, generation_config=None,
+                         request_options=None, **kwargs):
+        delay, error = self._draw()
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise api_exceptions.DeadlineExceeded("Deadline exceeded (fake).")
+        prompt = _prompt_text(contents)
+        text = answer(prompt, generation_config)
+        usage = _Usage(len(prompt) // 4, len(text) // 4)
+        if not stream:
+            time.sleep(delay)
+            if error:
+                raise _ERRORS[error]()
+            return FakeResponse(text, usage)
+        return self._stream(text, usage, delay, error)
+
+    def _stream(self, text, usage, delay, error):
+        # Time to first chunk is a fifth of the latency; the rest is spread evenly.
+        time.sleep(delay / 5)
+        if error:
+            raise _ERRORS[error]()
+        size = max(1, -(-len(text) // self.chunks))
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        for n, piece in enumerate(pieces):
+            if n:
+                time.sleep(delay * 4 / 5 / max(1, len(pieces) - 1))
+            yield FakeResponse(piece, usage)
+
+
+def _prompt_text(contents):
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    return "\n".join(p if isinstance(p, str) else "[image]" for p in parts)
+
+
+def _source(prompt):
+    """The material a prompt is about (after TEXT: or the last blank line)."""
+    if "TEXT:" in prompt:
+        return prompt.split("TEXT:", 1)[1].split("INSTRUCTIONS:", 1)[0]
+    return prompt.rsplit("\n\n", 1)[-1] if "\n\n" in prompt else prompt
+
+
+def _keywords(text, n):
+    counts = {}
+    for w in _WORD.findall(text):
+        counts[w.lower()] = counts.get(w.lower(), 0) + 1
+    ranked = sorted(counts, key=lambda w: (-counts[w], w))
+    return ranked[:n] or ["concept", "definition", "example", "summary"][:n]
+
+
+def _quiz(source, n, rng):
+    sentences = _SENTENCE.findall(source) or [f"Point {i} of the material is important." for i in range(n)]
+    vocabulary = list(dict.fromkeys(_keywords(source, 40) + ["process", "structure", "function", "theory"]))
+    questions = []
+    for i in range(n):
+        sentence = sentences[i % len(sentences)].strip()
+        words = [w for w in _WORD.findall(sentence) if w.lower() in vocabulary] or _WORD.findall(sentence) or ["concept"]
+        answer_word = words[rng.randrange(len(words))]
+        distractors = [w for w in vocabulary if w.lower() != answer_word.lower()]
+        rng.shuffle(distractors)
+        options = [answer_word] + distractors[:3]
+        rng.shuffle(options)
+        blanked = sentence.replace(answer_word, "_____", 1)
+        questions.append({"question": f"(Q{i + 1}) Fill in the blank: {blanked}", "options": options, "answer": answer_word})
+    return questions
+
+
+def _cards(source, n):
+    sentences = _SENTENCE.findall(source) or [f"Point {i} of the material is important." for i in range(n)]
+    cards = []
+    for i in range(n):
+        sentence = sentences[i % len(sentences)].strip()
+        cards.append({"front": f"(C{i + 1}) What does the material say about: {' '.join(sentence.split()[:8])}?",
+                      "back": sentence})
+    return cards
+
+
+def answer(prompt, generation_config=None):
+    """Canned answer for a prompt, deterministic per prompt."""
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+    source = _source(prompt)
+    wants_json = "json" in json.dumps(generation_config or {}, default=str).lower()
+
+    quiz = re.search(r"exactly (\d+) multiple-choice questions", prompt)
+    if quiz:
+        return json.dumps({"questions": _quiz(source, int(quiz.group(1)), rng)}, indent=2)
+    cards = re.search(r"exactly (\d+) flashcards", prompt)
+    if cards:
+        return json.dumps({"cards": _cards(source, int(cards.group(1)))}, indent=2)
+    if wants_json and '"summary"' in prompt:
+        words = _keywords(source, 8)
+        bullets = "\n".join(f"- Key idea about {w}." for w in words[:5])
+        return json.dumps({"summary": bullets, "keywords": words})
+    if "keywords" in prompt.lower():
+        return ", ".join(_keywords(source, 8))
+    if "summar" in prompt.lower():
+        return "\n".join(f"- Key idea about {w}." for w in _keywords(source, 5))
+
+    words = _keywords(source, 6)
+    return (
+        f"Here is a clear explanation (offline test backend, {len(prompt)} prompt chars).\n\n"
+        + "\n".join(f"{i}. Step about **{w}**." for i, w in enumerate(words, 1))
+        + "\n\nFurther reading: https://example.com/notes"
+    )
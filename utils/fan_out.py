@@ -0,0 +1,99 @@
+"""Ask for items from every chunk of a long source at once, balanced across chunks.
+
+Used by the quiz and flashcard generators. Chunks are sampled evenly when
+there are more of them than items wanted, each is asked for a quota in
+proportion to its length, and the answers are merged as they stream in:
+each chunk may pass on its fair share at once, and the rest are dealt out
+round-robin once every chunk has answered, so the whole source is covered
+rather than just its opening chunks. When enough items have arrived, the
+chunks still streaming are stopped.
+"""
+import math
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import scheduler
+
+MAX_WORKERS = 6
+
+
+def sample(chunks, count):
+    """At most `count` chunks, spread evenly over `chunks`."""
+    if len(chunks) <= count:
+        return chunks
+    step = len(chunks) / count
+    return [chunks[int(i * step)] for i in range(count)]
+
+
+def gather(chunks, total, ask, accept, oversample=1.0, max_workers=MAX_WORKERS):
+    """Yield up to `total` items from ask(chunk, quota) over `chunks`, as they arrive.
+
+    `ask` returns a generator of raw items; `accept(item)` returns what to
+    yield for it, or None to drop it (invalid or a duplicate). A failing
+    chunk is skipped, but scheduler.RateLimited is raised.
+    """
+    chunks = sample(chunks, total)
+    whole = sum(len(c) for c in chunks)
+    # Rounded up, so small quotas keep their oversampling too.
+    quotas = [math.ceil(total * oversample * len(c) / whole) for c in chunks]
+    # Items a chunk may pass on as soon as they arrive; rounded down so
+    # early chunks can't crowd out later ones.
+    shares = [max(1, total * len(c) // whole) for c in chunks]
+
+    arrivals = queue.Queue()
+    done = threading.Event()
+
+    def worker(index, chunk, quota):
+        items = ask(chunk, quota)
+        try:
+            for item in items:
+                if done.is_set():
+                    break
+                arrivals.put((index, item))
+        except scheduler.RateLimited as e:
+            arrivals.put((index, e))
+        except Exception:
+            pass  # one bad chunk shouldn't sink the whole batch
+        finally:
+            items.close()  # stop reading once the batch is full
+            arrivals.put((index, None))
+
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(chunks)))
+    try:
+        for index, (chunk, quota) in enumerate(zip(chunks, quotas)):
+            pool.submit(worker, index, chunk, quota)
+
+        # Anything beyond a chunk's share waits until every chunk is done.
+        taken = [0] * len(chunks)
+        extras = [[] for _ in chunks]
+        count = finished = 0
+        while finished < len(chunks) and count < total:
+            index, item = arrivals.get()
+            if item is None:
+                finished += 1
+                continue
+            if isinstance(item, scheduler.RateLimited):
+                raise item
+            item = accept(item)
+            if item is None:
+                continue
+            if taken[index] < shares[index]:
+                taken[index] += 1
+                count += 1
+                yield item
+            else:
+                extras[index].append(item)
+
+        # Deal out the rest round-robin so every part of the source is covered
+        # before any chunk contributes another item.
+        depth = 0
+        while count < total and any(depth < len(e) for e in extras):
+            for batch in extras:
+                if depth < len(batch) and count < total:
+                    count += 1
+                    yield batch[depth]
+            depth += 1
+    finally:
+        done.set()
+        pool.shutdown(wait=False, cancel_futures=True)
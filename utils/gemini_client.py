@@ -0,0 +1,337 @@
+"""Process-wide Gemini client shared by every page.
+
+One `GenerativeModel` is kept per (API key, model name), each bound to a
+per-key service client so the underlying HTTP/gRPC transport is reused across
+reruns and sessions instead of being rebuilt on every request. Setting
+GEMINI_BACKEND = "fake" swaps in the offline stand-in (utils/fake_gemini.py). Responses
+are served from the shared response cache (utils/llm_cache.py) when possible,
+identical concurrent calls are coalesced (utils/singleflight.py), and every
+upstream call waits its turn in the shared scheduler (utils/scheduler.py)
+and is charged to the user action it belongs to (a `scheduler.Charge`: one
+request from the student's daily bucket per action); cached and shared
+answers are free.
+Every call is recorded in utils/metrics.py under its `feature` name.
+"""
+import os
+import threading
+import time
+
+import google.ai.generativelanguage as glm
+import google.generativeai as genai
+import streamlit as st
+from google.api_core import exceptions as api_exceptions
+
+from utils import fake_gemini, llm_cache, metrics, resilience, scheduler, singleflight
+from utils.chunking import estimate_tokens
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+DEFAULT_TIMEOUT = 60  # seconds per call
+QUOTA_COOLDOWN = 20   # seconds to hold all calls after an upstream 429
+IMAGE_TOKENS = 258    # Gemini's flat token cost per image
+
+_lock = threading.Lock()
+_clients = {}  # api_key -> GenerativeServiceClient
+_models = {}   # (api_key, model_name) -> GenerativeModel
+
+
+def get_setting(name, default=None):
+    """A setting from .streamlit/secrets.toml, else the environment."""
+    value = None
+    try:
+        value = st.secrets.get(name)
+    except Exception:
+        pass  # Secrets file might not exist
+    return value if value is not None else os.environ.get(name, default)
+
+
+def use_fake_backend():
+    return str(get_setting("GEMINI_BACKEND", "gemini")).lower() == "fake"
+
+
+def get_api_key(user_key=""):
+    """Key typed by the user, else GEMINI_API_KEY from secrets or the environment."""
+    if user_key:
+        return user_key
+    key = get_setting("GEMINI_API_KEY")
+    if not key and use_fake_backend():
+        return "fake"  # the offline backend needs no key
+    return key
+
+
+def _fake_model(model_name):
+    return fake_gemini.FakeModel(
+        model_name,
+        latency=get_setting("FAKE_GEMINI_LATENCY", "fixed:0.3"),
+        chunks=get_setting("FAKE_GEMINI_CHUNKS", 8),
+        error_rate=get_setting("FAKE_GEMINI_ERROR_RATE", 0.0),
+        errors=get_setting("FAKE_GEMINI_ERRORS", "unavailable"),
+        seed=get_setting("FAKE_GEMINI_SEED", 0),
+    )
+
+
+def get_model(model_name=DEFAULT_MODEL, api_key=None):
+    """Shared model for this key and name, or None when no key is configured."""
+    key = api_key or get_api_key()
+    if not key:
+        return None
+    if use_fake_backend():
+        key = "fake"
+    with _lock:
+        model = _models.get((key, model_name))
+        if model is None:
+            if key == "fake":
+                model = _fake_model(model_name)
+            else:
+                client = _clients.get(key)
+                if client is None:
+                    client = glm.GenerativeServiceClient(client_options={"api_key": key})
+                    _clients[key] = client
+                model = genai.GenerativeModel(model_name)
+                # Bind to this key's client rather than the global genai.configure() one,
+                # so pages using different keys don't overwrite each other.
+                model._client = client
+            _models[(key, model_name)] = model
+    return model
+
+
+class GeminiBusy(RuntimeError):
+    """Upstream quota exhausted (HTTP 429) on every model in the chain."""
+
+
+def _cache_key(model_name, contents, kwargs):
+    # Keep the offline backend's canned answers apart from real ones.
+    prefix = "fake/" if use_fake_backend() else ""
+    return llm_cache.make_key(prefix + model_name, contents, kwargs)
+
+
+def _estimate_request_tokens(contents):
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    tokens = sum(estimate_tokens(p) if isinstance(p, str) else IMAGE_TOKENS for p in parts)
+    return tokens + scheduler.OUTPUT_TOKEN_ALLOWANCE
+
+
+def _record(feature, start, contents, model_name, text="", info=None, error=None, **fields):
+    """Record one generate/generate_stream call in utils/metrics.py."""
+    info = info or {}
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    usage = info.get("usage")
+    prompt_tokens = getattr(usage, "prompt_token_count", None)
+    if not prompt_tokens:
+        prompt_tokens = _estimate_request_tokens(contents) - scheduler.OUTPUT_TOKEN_ALLOWANCE
+    metrics.record(
+        "llm", feature, time.perf_counter() - start,
+        model=info.get("model", model_name),
+        prompt_chars=sum(len(p) for p in parts if isinstance(p, str)),
+        response_chars=len(text),
+        prompt_tokens=prompt_tokens,
+        response_tokens=getattr(usage, "candidates_token_count", None) or estimate_tokens(text),
+        attempts=info.get("attempts", 0),
+        error=type(error).__name__ if error else None,
+        **fields,
+    )
+
+
+def _send(model_name, api_key, contents, timeout, priority, **kwargs):
+    """Wait for a scheduler slot, then make one upstream call, all within `timeout` seconds.
+
+    The latency of a complete (non-streamed) answer, without the wait for the
+    slot, is what resilience bases its hedge delay on.
+    """
+    model = get_model(model_name, api_key)
+    start = time.monotonic()
+    scheduler.scheduler.acquire(priority, _estimate_request_tokens(contents), timeout=timeout)
+    sent = time.monotonic()
+    response = model.generate_content(
+        contents, request_options={"timeout": timeout - (sent - start)}, **kwargs
+    )
+    if not kwargs.get("stream"):
+        resilience.latency.record(model_name, time.monotonic() - sent)
+    return response
+
+
+def _charge(charge):
+    """Claim the action's request from the user's bucket; raises scheduler.RateLimited."""
+    if charge is not None:
+        charge.take()
+
+
+def _settle(charge, used):
+    if charge is not None:
+        charge.settle(used)
+
+
+def _resilient(attempt, model_name, hedge=False):
+    """Retry/fallback around attempt(model_name, timeout); a 429 everywhere pauses all calls."""
+    try:
+        return resilience.call(attempt, model_name, hedge=hedge)
+    except api_exceptions.TooManyRequests as e:
+        scheduler.scheduler.pause(QUOTA_COOLDOWN)
+        raise GeminiBusy(
+            f"Gemini is at its usage limit right now. Please try again in about {QUOTA_COOLDOWN}s."
+        ) from e
+
+
+def generate(contents, model_name=DEFAULT_MODEL, api_key=None, timeout=DEFAULT_TIMEOUT,
+             cache=True, priority=scheduler.INTERACTIVE, feature=None, charge=None, **kwargs):
+    """Run one generate_content call and return the response text.
+
+    `contents` is a prompt string or a list of parts (text, PIL images).
+    Extra keyword arguments (e.g. generation_config) go to generate_content
+    and are part of the cache key. Pass cache=False for calls that should
+    always hit the model. Identical calls already in flight are shared
+    rather than sent again; others queue at `priority` (scheduler.INTERACTIVE,
+    STANDARD or BULK). Transient failures are retried and overloaded models
+    fall back along resilience.FALLBACKS. `feature` ("page.feature") names
+    the call in the metrics log. A call that reaches the model claims
+    `charge`, the scheduler.Charge of the user action it is part of
+    (given back if the action gets no answer); scheduler.RateLimited is
+    raised when the user's bucket is empty. Raises RuntimeError when no API key
+    is configured.
+    """
+    api_key = api_key or get_api_key()
+    if not api_key:
+        raise RuntimeError("Gemini API key not configured.")
+
+    start = time.perf_counter()
+    key = _cache_key(model_name, contents, kwargs)
+    if cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            _record(feature, start, contents, model_name, cached, cache_hit=True)
+            return cached
+
+    info = {"attempts": 0}
+
+    def attempt(name, left):
+        info["attempts"] += 1
+        info["model"] = name
+        response = _send(name, api_key, contents, min(timeout, left), priority, **kwargs)
+        info["usage"] = getattr(response, "usage_metadata", None)
+        return response.text or ""
+
+    def call():
+        text = _resilient(attempt, model_name, hedge=True)
+        if cache:
+            llm_cache.put(key, text)
+        return text
+
+    _charge(charge)
+    try:
+        text = singleflight.do(key, call)
+    except Exception as e:
+        _settle(charge, False)
+        _record(feature, start, contents, model_name, info=info, error=e)
+        raise
+    # No attempts means this call shared an identical one already in flight.
+    shared = info["attempts"] == 0
+    _settle(charge, not shared)
+    _record(feature, start, contents, model_name, text, info, shared=shared)
+    return text
+
+
+def _chunk_text(chunk):
+    try:
+        return chunk.text or ""
+    except ValueError:  # chunk without text parts (e.g. a safety-only chunk)
+        return ""
+
+
+def generate_stream(contents, model_name=DEFAULT_MODEL, api_key=None, timeout=DEFAULT_TIMEOUT,
+                    cache=True, priority=scheduler.INTERACTIVE, feature=None, charge=None, **kwargs):
+    """Like generate(), but yield text chunks as the model produces them.
+
+    A cached answer is yielded in one piece; a fresh one is cached once the
+    stream has finished. Callers that join an identical stream already in
+    flight wait for it and get the full text in one piece; if the caller
+    that opened it stops reading, the rest is still read in the background. Retries and
+    fallback apply until the first chunk arrives; streams aren't hedged.
+    Metrics record the time to first chunk as well as the total.
+    """
+    api_key = api_key or get_api_key()
+    if not api_key:
+        raise RuntimeError("Gemini API key not configured.")
+
+    start = time.perf_counter()
+    key = _cache_key(model_name, contents, kwargs)
+    if cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            _record(feature, start, contents, model_name, cached, cache_hit=True, stream=True)
+            yield cached
+            return
+
+    _charge(charge)
+    call, leader = singleflight.begin(key)
+    if not leader:
+        _settle(charge, False)
+        text = call.wait()
+        _record(feature, start, contents, model_name, text, shared=True, stream=True)
+        yield text
+        return
+
+    info = {"attempts": 0}
+
+    def open_stream(name, left):
+        info["attempts"] += 1
+        info["model"] = name
+        chunks = iter(_send(name, api_key, contents, min(timeout, left), priority, stream=True, **kwargs))
+        for chunk in chunks:
+            text = _chunk_text(chunk)
+            if text:
+                return text, chunks
+        return "", chunks
+
+    parts = []
+    first_chunk = None
+
+    def read(chunks):
+        for chunk in chunks:
+            info["usage"] = getattr(chunk, "usage_metadata", None)
+            text = _chunk_text(chunk)
+            if text:
+                parts.append(text)
+                yield text
+
+    def fail(error):
+        _settle(charge, False)
+        singleflight.finish(key, call, error=error)
+        _record(feature, start, contents, model_name, "".join(parts), info, error, stream=True)
+
+    def complete(**fields):
+        text = "".join(parts)
+        if cache:
+            llm_cache.put(key, text)
+        _settle(charge, True)
+        singleflight.finish(key, call, result=text)
+        _record(feature, start, contents, model_name, text, info, stream=True,
+                first_chunk=round(first_chunk, 4), **fields)
+
+    def drain(chunks):
+        try:
+            for _ in read(chunks):
+                pass
+        except Exception as e:
+            fail(e)
+        else:
+            complete(abandoned=True)
+
+    try:
+        first, chunks = _resilient(open_stream, model_name)
+        first_chunk = time.perf_counter() - start
+        if first:
+            parts.append(first)
+            yield first
+        yield from read(chunks)
+    except Exception as e:
+        fail(e)
+        raise
+    except BaseException as e:
+        if first_chunk is None:
+            fail(RuntimeError("The identical request in flight was cancelled."))
+            raise
+        # The caller went away mid-answer (a rerun or Stop closes the generator).
+        # Read the rest in the background so callers sharing this stream still
+        # get the answer, and it is cached for the next time it is asked.
+        threading.Thread(target=drain, args=(chunks,), name="stream-drain", daemon=True).start()
+        raise
+    complete()
@@ -0,0 +1,106 @@
+"""Incremental parser for model answers shaped like {"<key>": [ {...}, {...} ]}.
+
+Feed it the response text chunk by chunk as it streams in; each object in
+the array is returned as soon as its closing brace arrives. Markdown fences
+and chatter around the JSON are ignored, an object that fails to parse is
+skipped without losing the ones around it, and a truncated answer still
+yields every object that was complete before the cut.
+"""
+import json
+
+
+class JsonArrayStream:
+    """Emit the objects of the array under `key` (or of a top-level array of objects).
+
+    A top-level array counts only if it comes before any object and starts
+    with one, so a bracket in chatter ("Here are [5] questions:") is ignored.
+    """
+
+    def __init__(self, key="questions"):
+        self.key = key
+        self.skipped = 0         # objects that closed but weren't valid JSON
+        self._buf = ""
+        self._pos = 0            # next character of _buf to scan
+        self._depth = 0          # nesting of {} and [] outside strings
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last = None        # last token outside strings: ("str", value), "key" or a character
+        self._array_depth = None  # depth inside the target array, once found
+        self._seen_object = False  # a "{" has appeared outside strings
+        self._item_start = None  # offset in _buf of the object being read
+
+    def feed(self, chunk):
+        """Consume more text; return the list of objects completed by it."""
+        self._buf += chunk
+        items = []
+        buf = self._buf
+        i = self._pos
+        while i < len(buf):
+            c = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._array_depth is None:
+                        self._last = ("str", buf[self._string_start + 1:i])
+            elif c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                if c == "[" and self._array_depth is None and self._last == "key":
+                    self._array_depth = self._depth + 1
+                elif c == "[" and self._array_depth is None and self._depth == 0 and not self._seen_object:
+                    # A bare top-level array only if an object follows; "[5]" in chatter is not one.
+                    nxt = i + 1
+                    while nxt < len(buf) and buf[nxt].isspace():
+                        nxt += 1
+                    if nxt == len(buf):
+                        break  # can't tell yet; look again when more text arrives
+                    if buf[nxt] == "{":
+                        self._array_depth = 1
+                elif c == "{" and self._depth == self._array_depth and self._item_start is None:
+                    self._item_start = i
+                self._depth += 1
+                self._last = c
+                self._seen_object = self._seen_object or c == "{"
+            elif c in "}]":
+                self._depth = max(0, self._depth - 1)
+                if c == "}" and self._item_start is not None and self._depth == self._array_depth:
+                    self._emit(buf[self._item_start:i + 1], items)
+                    self._item_start = None
+                elif c == "]" and self._array_depth is not None and self._depth < self._array_depth:
+                    self._array_depth = -1  # the array is closed; ignore anything after it
+                self._last = c
+            elif c == ":":
+                self._last = "key" if self._last == ("str", self.key) else c
+            elif not c.isspace():
+                self._last = c
+            i += 1
+
+        # Keep only what an unfinished object or string still needs.
+        keep = self._item_start if self._item_start is not None else (self._string_start if self._in_string else i)
+        self._buf = buf[keep:]
+        self._pos = i - keep
+        if self._item_start is not None:
+            self._item_start = 0
+        if self._in_string:
+            self._string_start -= keep
+        return items
+
+    def _emit(self, text, items):
+        try:
+            obj = json.loads(text)
+        except ValueError:
+            self.skipped += 1
+            return
+        if isinstance(obj, dict):
+            items.append(obj)
+
+
+def parse_array(raw, key="questions"):
+    """All objects recoverable from a complete (or truncated) answer."""
+    return JsonArrayStream(key).feed(raw)
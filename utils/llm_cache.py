@@ -0,0 +1,70 @@
+"""Persistent cache of Gemini responses, shared by all sessions and processes.
+
+Keys are the model name plus a SHA-256 over the normalized prompt parts:
+text is normalized (Unicode NFC, newlines, trailing spaces) and images or
+raw bytes are hashed by content, so the same question with the same upload
+hits the cache no matter which session sent it.
+"""
+import hashlib
+import json
+import re
+import unicodedata
+
+from utils.disk_cache import DiskCache
+
+TTL = 7 * 24 * 3600           # seconds a cached answer stays valid
+MAX_BYTES = 128 * 1024 * 1024
+
+_cache = None
+_TRAILING_SPACE = re.compile(r"[ \t]+$", re.MULTILINE)
+
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        _cache = DiskCache("llm_responses", MAX_BYTES, ttl=TTL)
+    return _cache
+
+
+def normalize_text(text):
+    """Canonical form of a prompt string. Indentation is kept (code prompts)."""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n")
+    return _TRAILING_SPACE.sub("", text).strip()
+
+
+def _update(h, part):
+    if isinstance(part, str):
+        h.update(b"s" + normalize_text(part).encode("utf-8"))
+    elif isinstance(part, (bytes, bytearray)):
+        h.update(b"b" + bytes(part))
+    elif hasattr(part, "tobytes") and hasattr(part, "size"):  # PIL image
+        h.update(f"i{part.mode}{part.size}".encode() + part.tobytes())
+    elif isinstance(part, dict):  # {"mime_type": ..., "data": ...} blobs
+        for k in sorted(part):
+            h.update(f"k{k}".encode())
+            _update(h, part[k])
+    elif isinstance(part, (list, tuple)):
+        for item in part:
+            _update(h, item)
+    else:
+        h.update(b"r" + repr(part).encode("utf-8"))
+    h.update(b"\x00")
+
+
+def make_key(model_name, contents, options=None):
+    """Cache key for a call; `options` covers settings that change the output."""
+    h = hashlib.sha256()
+    h.update(model_name.encode("utf-8") + b"\x00")
+    _update(h, contents)
+    if options:
+        h.update(json.dumps(options, sort_keys=True, default=repr).encode("utf-8"))
+    return f"{model_name}:{h.hexdigest()}"
+
+
+def get(key):
+    return _get_cache().get(key)
+
+
+def put(key, text):
+    if text:
+        _get_cache().set(key, text)
@@ -0,0 +1,288 @@
+"""Offline fill-in-the-blank MCQ engine (no model call).
+
+Sentences are tokenized and POS-tagged with NLTK, key terms are picked per
+sentence by TF-IDF over the sentences of the document, the chosen term is
+blanked out, and distractors are drawn from terms in the same document with
+the same part of speech and a similar document frequency. Scoring is done
+on NumPy arrays in one pass, so thousands of questions cost little more
+than tokenizing the text.
+
+Questions use the same dict schema as the AI generator
+({"question", "options", "answer", "concept"}).
+
+NLTK's perceptron tagger is used; its data is downloaded into the cache
+directory in the background the first time the engine runs, unless it is
+already installed. Until it has arrived (or if it can't, e.g. offline) a
+suffix-based tagger stands in.
+"""
+import os
+import random
+import re
+import threading
+
+import numpy as np
+
+from utils.disk_cache import CACHE_DIR
+
+MIN_WORDS = 6          # shorter sentences make ambiguous blanks
+MAX_WORDS = 45
+MIN_TERM_LENGTH = 3
+MAX_PER_TERM = 2      # questions sharing one answer, from different sentences
+BLANK = "_____"
+NOUN_TAGS = ("NN", "NNS", "NNP", "NNPS")
+TAGGER_PACKAGE = "averaged_perceptron_tagger_eng"
+NLTK_DATA = os.path.join(CACHE_DIR, "nltk_data")
+
+_TOKEN = re.compile(r"[A-Za-z][A-Za-z'-]*[A-Za-z]|[A-Za-z]|\d+(?:\.\d+)?|\S")
+_STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each either etc few for from
+further had has have having he her here hers herself him himself his how however i if in into is
+it its itself just may me might more most must my myself no nor not now of off on once only or
+other our ours ourselves out over own same she should so some such than that the their theirs
+them themselves then there these they this those through thus to too under until up upon us very
+was we were what when where which while who whom why will with within without would you your
+yours yourself yourselves chapter section unit example figure table page called known used use
+""".split())
+
+_FALLBACK_PATTERNS = [
+    (r"^\d+(\.\d+)?$", "CD"),
+    (r"^[A-Z][a-z]+(?:-[A-Z]?[a-z]+)*$", "NNP"),
+    (r".*(ing)$", "VBG"),
+    (r".*(ed)$", "VBD"),
+    (r".*(ly)$", "RB"),
+    (r".*(ous|ful|ive|able|ible|ic|ical|less|ary)$", "JJ"),
+    (r".*(ness|ment|tion|sion|ity|ism|ance|ence|ship|ure|ogy)$", "NN"),
+    (r".*(ss|us|is)$", "NN"),
+    (r".*s$", "?S"),  # plural noun or third-person verb ("cells", "divides")
+    (r".*", "?"),     # noun or verb ("membrane", "absorb")
+]
+# Words after which a noun-or-verb word is read as a noun (see _resolve).
+_NOUN_CONTEXT = frozenset("""
+a an the this these those its their his her our your my of in on at for with from by into onto about
+each every some any many several few both all no
+""".split())
+
+_tagger = None
+_contextual = False  # whether the tagger looks at neighbouring words
+_tagger_lock = threading.Lock()
+_download = None     # thread fetching the perceptron tagger's data
+
+
+def _perceptron():
+    """NLTK's perceptron tagger, or None while its data is missing.
+
+    The first call without the data starts downloading it into NLTK_DATA on
+    a background thread, once per process; nothing waits for it.
+    """
+    global _download
+    import nltk
+    from nltk.tag import PerceptronTagger
+
+    if _download is not None and _download.is_alive():
+        return None
+    if NLTK_DATA not in nltk.data.path:
+        nltk.data.path.append(NLTK_DATA)
+    try:
+        return PerceptronTagger()
+    except (LookupError, OSError):
+        pass
+    if _download is None:
+        _download = threading.Thread(
+            target=nltk.download, args=(TAGGER_PACKAGE,), kwargs={"download_dir": NLTK_DATA, "quiet": True},
+            name="nltk-download", daemon=True,
+        )
+        _download.start()
+    return None
+
+
+def _get_tagger():
+    """NLTK's perceptron tagger; the suffix-based one while that is unavailable."""
+    global _tagger, _contextual
+    with _tagger_lock:
+        if not _contextual:
+            # NLTK takes over a second to import; only pay for it when the engine is used.
+            from nltk.tag import RegexpTagger
+
+            tagger = _perceptron()
+            if tagger is not None:
+                _tagger, _contextual = tagger, True
+            elif _tagger is None:
+                _tagger = RegexpTagger(_FALLBACK_PATTERNS)
+        return _tagger, _contextual
+
+
+def _resolve(tagged):
+    """Settle the suffix tagger's noun-or-verb words from the words before them.
+
+    Such a word is a noun after a determiner, preposition, adjective or verb
+    ("absorb light"), and a bare one is a noun after a singular noun ("cell
+    membrane"). It takes the part of speech of the word it is coordinated
+    with ("light and water"), and is a verb otherwise ("cells divide").
+    """
+    resolved = []
+    previous = previous_tag = coordinated_tag = ""
+    for word, tag in tagged:
+        key = word.lower()
+        if tag.startswith("?"):
+            if not word[0].isalpha():
+                tag = "."
+            elif key in _STOPWORDS:
+                tag = "IN"
+            else:
+                if previous in ("and", "or"):
+                    noun = coordinated_tag.startswith("NN")
+                else:
+                    noun = (previous in _NOUN_CONTEXT or previous_tag.startswith(("JJ", "VB"))
+                            or (tag == "?" and previous_tag == "NN"))
+                tag = ("NNS" if noun else "VBZ") if tag == "?S" else ("NN" if noun else "VB")
+        if key not in ("and", "or"):
+            coordinated_tag = tag
+        resolved.append((word, tag))
+        previous, previous_tag = key, tag
+    return resolved
+
+
+def _tag(token_lists):
+    tagger, contextual = _get_tagger()
+    if contextual:
+        return tagger.tag_sents(token_lists)
+    # The suffix tagger ignores context: tag each distinct word once.
+    vocabulary = list({t for tokens in token_lists for t in tokens})
+    tags = dict(zip(vocabulary, (tag for _, tag in tagger.tag(vocabulary))))
+    return [_resolve([(t, tags[t]) for t in tokens]) for tokens in token_lists]
+
+
+def _sentences(text):
+    """Sentences of quiz-able length, with their tokens."""
+    from nltk.tokenize import PunktSentenceTokenizer
+
+    text = re.sub(r"\s+", " ", text)
+    kept = []
+    for sentence in PunktSentenceTokenizer().tokenize(text):
+        tokens = _TOKEN.findall(sentence)
+        words = sum(1 for t in tokens if t[0].isalpha())
+        if MIN_WORDS <= words <= MAX_WORDS:
+            kept.append((sentence.strip(), tokens))
+    return kept
+
+
+def _terms(tagged_sentences):
+    """Candidate answers: (sentence index, term id) pairs plus per-term vocabulary data."""
+    ids = {}
+    surface = []   # original spelling of each term, as first seen
+    tags = []      # part-of-speech tag each term was first seen with
+    rows, cols = [], []
+    for s, tagged in enumerate(tagged_sentences):
+        for word, tag in tagged:
+            key = word.lower()
+            if (tag not in NOUN_TAGS and not tag.startswith("JJ")) or len(key) < MIN_TERM_LENGTH \
+                    or key in _STOPWORDS or not word[0].isalpha():
+                continue
+            if key not in ids:
+                ids[key] = len(surface)
+                surface.append(word)
+                tags.append(tag)
+            rows.append(s)
+            cols.append(ids[key])
+    return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64), surface, tags
+
+
+def _best_terms(rows, cols, num_sentences, num_terms):
+    """Per sentence, the term with the highest TF-IDF and its score."""
+    pair = rows * num_terms + cols
+    unique_pairs, tf = np.unique(pair, return_counts=True)
+    sentence, term = np.divmod(unique_pairs, num_terms)
+    df = np.bincount(term, minlength=num_terms)
+    # Terms found in a single sentence can't get good distractor context, and
+    # terms in most sentences are too generic to test.
+    idf = np.log((1 + num_sentences) / (1 + df)) + 1
+    useful = (df > 1) & (df < max(3, num_sentences // 2))
+    score = tf * idf[term] * useful[term]
+
+    # Sort by sentence, then score descending; the first row of each sentence wins.
+    order = np.lexsort((-score, sentence))
+    sentence, term, score = sentence[order], term[order], score[order]
+    first = np.ones(len(sentence), dtype=bool)
+    first[1:] = sentence[1:] != sentence[:-1]
+    return sentence[first], term[first], score[first], df
+
+
+def _distractors(answer, candidates, df, surface, rng, count=3):
+    """`count` terms closest to `answer` in document frequency and length."""
+    pool = candidates[candidates != answer]
+    if len(pool) < count:
+        return []
+    lengths = np.array([len(surface[t]) for t in pool])
+    distance = np.abs(np.log1p(df[pool]) - np.log1p(df[answer])) \
+        + 0.1 * np.abs(lengths - len(surface[answer])) + rng.random(len(pool)) * 0.5
+    picked = []
+    answer_key = surface[answer].lower()
+    for t in pool[np.argsort(distance)]:
+        key = surface[t].lower()
+        # Skip spellings that overlap the answer ("cell" vs "cells").
+        if key in answer_key or answer_key in key or any(key == surface[p].lower() for p in picked):
+            continue
+        picked.append(t)
+        if len(picked) == count:
+            break
+    return picked if len(picked) == count else []
+
+
+def generate_questions(text, num_questions=5, seed=None):
+    """Up to `num_questions` fill-in-the-blank MCQs from `text`, best sentences first."""
+    sentences = _sentences(text)
+    if not sentences:
+        return []
+    tagged = _tag([tokens for _, tokens in sentences])
+    rows, cols, surface, tags = _terms(tagged)
+    if len(surface) < 4:
+        return []
+
+    num_terms = len(surface)
+    best_sentence, best_term, best_score, df = _best_terms(rows, cols, len(sentences), num_terms)
+    ranked = np.argsort(-best_score, kind="stable")
+
+    tags = np.array(tags)
+    by_tag = {tag: np.flatnonzero(tags == tag) for tag in set(tags)}
+    all_terms = np.arange(num_terms)
+    rng = np.random.default_rng(seed)
+    shuffle = random.Random(seed)
+
+    questions = []
+    uses = {}
+    used = set()   # sentences already asked about; headers and footers repeat on every page
+    asked = set()  # question texts, which different sentences can share once blanked
+    for i in ranked:
+        if best_score[i] <= 0 or len(questions) >= num_questions:
+            break
+        term = int(best_term[i])
+        if uses.get(term, 0) >= MAX_PER_TERM:
+            continue  # keeps the quiz varied
+        sentence = sentences[best_sentence[i]][0]
+        if sentence.lower() in used:
+            continue
+        same_pos = by_tag[tags[term]]
+        options = _distractors(term, same_pos if len(same_pos) > 3 else all_terms, df, surface, rng)
+        if not options:
+            continue
+
+        answer = surface[term]
+        pattern = re.compile(rf"\b{re.escape(answer)}\b", re.IGNORECASE)
+        if len(pattern.findall(sentence)) != 1:
+            continue  # a second occurrence would give the answer away
+        question = "Fill in the blank: " + pattern.sub(BLANK, sentence, count=1)
+        if question.lower() in asked:
+            continue
+        uses[term] = uses.get(term, 0) + 1
+        used.add(sentence.lower())
+        asked.add(question.lower())
+        choices = [answer] + [surface[t] for t in options]
+        shuffle.shuffle(choices)
+        questions.append({
+            "question": question,
+            "options": choices,
+            "answer": answer,
+            "concept": answer.lower(),
+        })
+    return questions
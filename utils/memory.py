@@ -0,0 +1,130 @@
+"""Bounded conversation memory for the chat pages.
+
+A prompt carries the last KEEP_TURNS exchanges verbatim plus a rolling
+summary of everything before them, so follow-up questions make sense to
+the model while the prompt size stays flat however long the chat gets:
+
+- Recent turns are kept newest first until RECENT_TOKENS is reached, and
+  each message is clipped to MESSAGE_TOKENS.
+- When messages fall out of the recent window, they are folded into the
+  summary by a background model call (the old summary plus only the new
+  turns, FOLD_TOKENS at a time), so the user never waits on it. Until it
+  finishes, prompts use the previous summary.
+- The summary is capped at SUMMARY_TOKENS.
+
+Sizes are estimated locally with `chunking.estimate_tokens`.
+"""
+import threading
+
+from utils import gemini_client, scheduler
+from utils.chunking import CHARS_PER_TOKEN, estimate_tokens
+
+KEEP_TURNS = 4         # user + assistant exchanges kept verbatim
+RECENT_TOKENS = 2000
+MESSAGE_TOKENS = 600
+SUMMARY_TOKENS = 400
+FOLD_TOKENS = 3000     # new conversation text per summary refresh
+
+FOLD_PROMPT = """You maintain a running summary of a tutoring conversation.
+
+Current summary:
+{summary}
+
+New messages:
+{turns}
+
+Rewrite the summary to include the new messages. Keep the topics covered,
+the student's questions, key answers, and anything the student said about
+themselves or their goals. Under 200 words, plain text."""
+
+
+def _clip(text, tokens):
+    limit = tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit].rstrip() + " …"
+
+
+def _line(msg):
+    speaker = "Student" if msg["role"] == "user" else "Tutor"
+    return f"{speaker}: {_clip(msg['text'], MESSAGE_TOKENS)}"
+
+
+class Memory:
+    """Rolling memory of one chat; keep one per session and replace it when the chat is cleared."""
+
+    def __init__(self):
+        self.summary = ""
+        self.folded = 0          # messages already in the summary
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def _recent_start(self, messages):
+        """Index of the first message kept verbatim."""
+        start = len(messages)
+        tokens = 0
+        turns = 0
+        while start > 0:
+            msg = messages[start - 1]
+            cost = estimate_tokens(_line(msg))
+            if tokens + cost > RECENT_TOKENS:
+                break
+            tokens += cost
+            start -= 1
+            if msg["role"] == "user":
+                turns += 1
+                if turns == KEEP_TURNS:
+                    break
+        return start
+
+    def context(self, messages):
+        """Prompt parts recalling `messages` (the chat so far, before the new question)."""
+        if not messages:
+            return []
+        start = self._recent_start(messages)
+        with self._lock:
+            summary = self.summary
+        parts = []
+        if summary:
+            parts.append(f"Summary of the earlier conversation:\n{summary}")
+        if start < len(messages):
+            recent = "\n\n".join(_line(m) for m in messages[start:])
+            parts.append(f"Recent conversation:\n{recent}")
+        return parts
+
+    def update(self, messages, model_name=gemini_client.DEFAULT_MODEL, api_key=None, feature="chat.memory",
+               charge=None):
+        """Fold messages that have left the recent window into the summary, in the background.
+
+        `feature` ("page.memory") names the summary calls in the metrics log;
+        they are part of the chat turn whose scheduler.Charge is `charge`, so
+        they don't cost the student another request.
+        """
+        start = self._recent_start(messages)
+        with self._lock:
+            if start <= self.folded or (self._worker and self._worker.is_alive()):
+                return
+            pending = list(messages[self.folded:start])
+            self._worker = threading.Thread(
+                target=self._fold, args=(pending, model_name, api_key, feature, charge), name="memory-fold",
+                daemon=True,
+            )
+            self._worker.start()
+
+    def _fold(self, pending, model_name, api_key, feature, charge):
+        while pending:
+            batch, tokens = [], 0
+            while pending and (not batch or tokens + estimate_tokens(_line(pending[0])) <= FOLD_TOKENS):
+                tokens += estimate_tokens(_line(pending[0]))
+                batch.append(pending.pop(0))
+            with self._lock:
+                summary = self.summary
+            prompt = FOLD_PROMPT.format(summary=summary or "(empty)", turns="\n\n".join(_line(m) for m in batch))
+            try:
+                text = gemini_client.generate(
+                    prompt, model_name=model_name, api_key=api_key, priority=scheduler.BULK, feature=feature,
+                    charge=charge,
+                )
+            except Exception:
+                return  # keep the old summary (also when out of requests); the next update() retries
+            with self._lock:
+                self.summary = _clip(text.strip(), SUMMARY_TOKENS)
+                self.folded += len(batch)
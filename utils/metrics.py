@@ -0,0 +1,186 @@
+"""Lightweight instrumentation for model calls and PDF extraction.
+
+Each call is recorded as a small dict (latency, sizes, tokens, cache hit,
+attempts, error) in a bounded in-memory ring buffer. A background thread
+appends the buffer to a JSON-lines file under the cache directory every
+FLUSH_INTERVAL seconds, so every Streamlit process feeds the same log and
+the Dashboard's operator view can read it back.
+
+Features are named "<page>.<feature>", e.g. "summarizer.map" or
+"quiz.generate"; the part before the first dot is the page.
+"""
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from utils.disk_cache import CACHE_DIR
+
+RING_SIZE = 5000                  # records kept in memory between flushes
+FLUSH_INTERVAL = 5                # seconds
+MAX_FILE_BYTES = 20 * 1024 * 1024  # rotate the log beyond this size
+LOG_PATH = os.path.join(CACHE_DIR, "metrics.jsonl")
+
+_buffer = deque(maxlen=RING_SIZE)
+_lock = threading.Lock()
+_flusher = None
+_dropped = 0
+
+
+def record(kind, feature, latency, **fields):
+    """Add one record. `kind` is "llm" or "pdf"; extra fields are stored as-is."""
+    global _dropped
+    entry = {"ts": round(time.time(), 3), "kind": kind, "feature": feature or "unknown",
+             "latency": round(latency, 4)}
+    entry.update(fields)
+    with _lock:
+        if len(_buffer) == _buffer.maxlen:
+            _dropped += 1  # the oldest unflushed record falls off the ring
+        _buffer.append(entry)
+    _ensure_flusher()
+
+
+def page_of(feature):
+    return feature.split(".", 1)[0]
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is None:
+        with _lock:
+            if _flusher is None:
+                _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+                _flusher.start()
+                atexit.register(flush)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError:
+            pass  # keep buffering; the ring bounds memory until the disk is back
+
+
+def flush():
+    """Append buffered records to the log file."""
+    with _lock:
+        if not _buffer:
+            return
+        entries = list(_buffer)
+        _buffer.clear()
+    lines = "".join(json.dumps(e, separators=(",", ":")) + "\n" for e in entries)
+    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+    if os.path.exists(LOG_PATH) and os.path.getsize(LOG_PATH) > MAX_FILE_BYTES:
+        os.replace(LOG_PATH, LOG_PATH + ".1")
+    # One write per batch; O_APPEND keeps batches from different processes whole.
+    with open(LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(lines)
+
+
+_parsed_lock = threading.Lock()
+_parsed = []          # records read so far from the rotated file and LOG_PATH
+_parsed_file = None   # (device, inode) of the LOG_PATH they came from
+_parsed_offset = 0    # bytes of LOG_PATH already parsed
+
+
+def _parse(f, offset=0):
+    """Records in `f` from `offset` to its last complete line; returns (records, end offset)."""
+    f.seek(offset)
+    data = f.read()
+    end = data.rfind(b"\n") + 1  # a partly written last line is read next time
+    entries = []
+    for line in data[:end].splitlines():
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries, offset + end
+
+
+def _read_rotated():
+    try:
+        with open(LOG_PATH + ".1", "rb") as f:
+            return _parse(f)[0]
+    except FileNotFoundError:
+        return []
+
+
+def load(since=0.0):
+    """Records from the log (current and rotated file) with ts >= since.
+
+    The log is parsed incrementally: each call reads only the lines
+    appended since the previous one, and starts over after a rotation.
+    """
+    global _parsed, _parsed_file, _parsed_offset
+    flush()
+    with _parsed_lock:
+        try:
+            with open(LOG_PATH, "rb") as f:
+                stat = os.fstat(f.fileno())
+                ident = (stat.st_dev, stat.st_ino)
+                if ident != _parsed_file or stat.st_size < _parsed_offset:  # first load, or rotated
+                    _parsed, _parsed_file, _parsed_offset = _read_rotated(), ident, 0
+                entries, _parsed_offset = _parse(f, _parsed_offset)
+                _parsed.extend(entries)
+        except FileNotFoundError:
+            _parsed, _parsed_file, _parsed_offset = _read_rotated(), None, 0
+        return [e for e in _parsed if e.get("ts", 0) >= since]
+
+
+def log_size():
+    """Bytes in the log files once buffered records are flushed; grows with every flush."""
+    flush()
+    size = 0
+    for path in (LOG_PATH + ".1", LOG_PATH):
+        try:
+            size += os.path.getsize(path)
+        except OSError:
+            continue
+    return size
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def aggregate(entries, key="feature"):
+    """One summary row per value of `key` ("feature" or "page"), slowest p95 first."""
+    groups = {}
+    for e in entries:
+        name = page_of(e["feature"]) if key == "page" else e["feature"]
+        groups.setdefault((e["kind"], name), []).append(e)
+
+    rows = []
+    for (kind, name), group in groups.items():
+        # Cache hits cost neither upstream time nor tokens.
+        fresh = [e for e in group if not e.get("cache_hit")]
+        latencies = sorted(e["latency"] for e in fresh)
+        rows.append({
+            key: name,
+            "kind": kind,
+            "calls": len(group),
+            "p50 (s)": percentile(latencies, 50),
+            "p95 (s)": percentile(latencies, 95),
+            "p99 (s)": percentile(latencies, 99),
+            "cache hit %": round(100 * sum(1 for e in group if e.get("cache_hit")) / len(group), 1),
+            "errors": sum(1 for e in group if e.get("error")),
+            "retries": sum(max(0, e.get("attempts", 1) - 1) for e in group),
+            "tokens in": sum(e.get("prompt_tokens") or 0 for e in fresh),
+            "tokens out": sum(e.get("response_tokens") or 0 for e in fresh),
+        })
+    rows.sort(key=lambda r: -(r["p95 (s)"] or 0))
+    return rows
+
+
+def dropped():
+    """Records lost because the ring filled up before a flush."""
+    return _dropped
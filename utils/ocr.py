@@ -0,0 +1,147 @@
+"""OCR fallback for scanned PDF pages.
+
+Pages with no embedded text are rasterized and run through Tesseract on a
+small process pool of their own, so OCR never starves plain text extraction.
+Results are cached under a hash of the page's own drawing instructions and
+embedded images (read from the PDF without rendering), so the same scanned
+handout is only rasterized and OCR'd once even when it shows up inside
+different uploads.
+"""
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pdfplumber
+from pdfminer.pdftypes import resolve1
+
+from utils.disk_cache import DiskCache
+
+MAX_WORKERS = max(1, min(4, os.cpu_count() or 1))
+RESOLUTION = 300          # DPI used to rasterize pages for Tesseract
+MIN_TEXT_CHARS = 16       # pages with less embedded text than this get OCR'd
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+_cache = None
+_available = None
+_pytesseract = None
+
+
+def _tesseract():
+    """pytesseract, or None when it isn't installed (OCR is optional; scanned pages just stay empty).
+
+    Imported on first use: it pulls in pandas, which every page importing
+    utils.ui would otherwise pay for at startup.
+    """
+    global _pytesseract
+    if _pytesseract is None:
+        try:
+            import pytesseract
+            _pytesseract = pytesseract
+        except ImportError:
+            _pytesseract = False
+    return _pytesseract or None
+
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        _cache = DiskCache("ocr_text", CACHE_MAX_BYTES)
+    return _cache
+
+
+def is_available():
+    """True when pytesseract and the tesseract binary are both installed."""
+    global _available
+    if _available is None:
+        pytesseract = _tesseract()
+        if pytesseract is None:
+            _available = False
+        else:
+            try:
+                pytesseract.get_tesseract_version()
+                _available = True
+            except Exception:
+                _available = False
+    return _available
+
+
+def needs_ocr(text):
+    return len(text.strip()) < MIN_TEXT_CHARS
+
+
+def _streams(obj):
+    """Raw (still encoded) bytes of a content stream or a list of them."""
+    obj = resolve1(obj)
+    if isinstance(obj, list):
+        return b"".join(_streams(item) for item in obj)
+    return getattr(obj, "get_rawdata", lambda: None)() or b""
+
+
+def _page_digest(page):
+    """Hash of what the page draws: its content streams and XObjects (scanned images), plus geometry."""
+    page_obj = page.page_obj
+    h = hashlib.sha256(f"{RESOLUTION}:{page_obj.rotate}:{page_obj.mediabox}".encode())
+    h.update(_streams(page_obj.contents))
+    xobjects = resolve1((page_obj.resources or {}).get("XObject")) or {}
+    for name in sorted(xobjects):
+        h.update(name.encode() + _streams(xobjects[name]))
+    return h.hexdigest()
+
+
+def _ocr_page(path, page_index):
+    """Worker: OCR one page, rasterizing it only on a cache miss."""
+    with pdfplumber.open(path) as pdf:
+        page = pdf.pages[page_index]
+        digest = _page_digest(page)
+        cache = _get_cache()
+        text = cache.get(digest)
+        if text is None:
+            image = page.to_image(resolution=RESOLUTION).original
+            text = _tesseract().image_to_string(image)
+            cache.set(digest, text)
+        page.close()
+    return text
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            ctx = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=ctx)
+        return _pool
+
+
+def _drop_pool(pool):
+    """Forget a pool whose worker died (it has already terminated the rest)."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+
+def submit(path, page_index):
+    """Queue OCR for one page of the PDF at `path`; returns a Future.
+
+    If a worker dies (e.g. Tesseract killed for memory), the pages it took
+    down fail with BrokenProcessPool and later pages go to a new pool.
+    """
+    pool = _get_pool()
+    try:
+        future = pool.submit(_ocr_page, path, page_index)
+    except BrokenProcessPool:
+        _drop_pool(pool)
+        pool = _get_pool()
+        future = pool.submit(_ocr_page, path, page_index)
+
+    def check(done):
+        if not done.cancelled() and isinstance(done.exception(), BrokenProcessPool):
+            _drop_pool(pool)
+
+    future.add_done_callback(check)
+    return future
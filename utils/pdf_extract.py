@@ -0,0 +1,241 @@
+"""Shared PDF text extraction for the Quiz, Flashcards and Doubt Solver pages.
+
+Pages are split into small ranges and extracted on a process pool so a big
+course pack uses every core instead of one. Text is yielded page by page (in
+page order) so callers can show progress, and joined only once at the end.
+
+Extracted pages are cached on disk under the SHA-256 of the uploaded bytes,
+so uploading the same lecture PDF again skips pdfplumber entirely.
+Scanned pages fall back to OCR (see utils/ocr.py).
+"""
+import hashlib
+import io
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pdfplumber
+
+from utils import metrics, ocr
+from utils.disk_cache import DiskCache
+
+MAX_WORKERS = max(1, min(8, os.cpu_count() or 1))
+PARALLEL_MIN_PAGES = 12   # below this, starting workers costs more than it saves
+MIN_PAGES_PER_TASK = 4
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+_cache = None
+
+
+def _get_pool():
+    """Process-wide extraction pool, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # "spawn" keeps workers clear of the Streamlit server's threads.
+            ctx = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=ctx)
+        return _pool
+
+
+def _drop_pool(pool):
+    """Forget a pool whose worker died, so the next _get_pool() starts a fresh one.
+
+    A broken pool has already terminated its workers; nothing to shut down.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        _cache = DiskCache("pdf_text", CACHE_MAX_BYTES)
+    return _cache
+
+
+def read_upload(source):
+    """Return the raw bytes of an uploaded file, a file object, or bytes."""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    data = source.read()
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return data
+
+
+def _extract_pages(path, page_indices):
+    """Worker: extract text for the given 0-based pages of the PDF at `path`."""
+    texts = []
+    with pdfplumber.open(path) as pdf:
+        for i in page_indices:
+            page = pdf.pages[i]
+            texts.append(page.extract_text() or "")
+            page.close()  # drop pdfplumber's per-page object cache
+    return texts
+
+
+def _page_count(data):
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        return len(pdf.pages)
+
+
+def _iter_serial(path, page_indices):
+    with pdfplumber.open(path) as pdf:
+        for i in page_indices:
+            page = pdf.pages[i]
+            yield i, page.extract_text() or ""
+            page.close()
+
+
+def _iter_extracted(path, page_indices):
+    """Yield (index, text) for `page_indices`, in the order given."""
+    if len(page_indices) < PARALLEL_MIN_PAGES or MAX_WORKERS == 1:
+        yield from _iter_serial(path, page_indices)
+        return
+
+    per_task = max(MIN_PAGES_PER_TASK, math.ceil(len(page_indices) / (MAX_WORKERS * 4)))
+    pool = _get_pool()
+    tasks = [page_indices[n:n + per_task] for n in range(0, len(page_indices), per_task)]
+    futures = []
+    done = 0
+    try:
+        for task in tasks:
+            futures.append(pool.submit(_extract_pages, path, task))
+        for task, future in zip(tasks, futures):
+            yield from zip(task, future.result())
+            done += 1
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory). The next upload gets a new
+        # pool; this one finishes in-process.
+        _drop_pool(pool)
+        yield from _iter_serial(path, [i for task in tasks[done:] for i in task])
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def iter_pdf_pages(source, use_cache=True, feature=None):
+    """Yield (page_number, page_count, text) for every page, in page order.
+
+    Cached pages come straight from disk; the rest are fanned out across the
+    process pool and yielded as soon as their range is done, while later
+    ranges keep running. Pages without embedded text (scans) are sent to the
+    OCR pool as soon as they are found and yielded once recognised. The whole
+    extraction is recorded in utils/metrics.py under `feature`.
+    """
+    start = time.perf_counter()
+    data = read_upload(source)
+    digest = hashlib.sha256(data).hexdigest()
+    cache = _get_cache() if use_cache else None
+
+    total = None
+    cached = {}
+    if cache is not None:
+        count = cache.get(f"{digest}:pages")
+        if count is not None:
+            total = int(count)
+            keys = [f"{digest}:{i}" for i in range(total)]
+            hits = cache.get_many(keys)
+            cached = {i: hits[key] for i, key in enumerate(keys) if key in hits}
+    if total is None:
+        total = _page_count(data)
+
+    missing = [i for i in range(total) if i not in cached]
+    if not missing:
+        for i in range(total):
+            yield i + 1, total, cached[i]
+        metrics.record("pdf", feature, time.perf_counter() - start, pages=total,
+                       cached_pages=total, bytes=len(data), cache_hit=True)
+        return
+
+    use_ocr = ocr.is_available()
+    # Extraction and OCR workers read a temp file instead of receiving the bytes.
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+
+    extracted = _iter_extracted(path, missing)
+    pending = deque()  # (index, text or OCR future), kept in page order
+    fresh = {}
+    ocr_pages = 0
+    error = None
+    try:
+        for i in range(total):
+            if i in cached:
+                pending.append((i, cached[i]))
+            else:
+                _, text = next(extracted)
+                if use_ocr and ocr.needs_ocr(text):
+                    ocr_pages += 1
+                    pending.append((i, ocr.submit(path, i)))
+                else:
+                    pending.append((i, text))
+                    if not ocr.needs_ocr(text):  # a text-less page is read again once OCR is installed
+                        fresh[f"{digest}:{i}"] = text
+
+            # Yield everything at the front that is ready, without waiting on OCR.
+            while pending and not (isinstance(pending[0][1], Future) and not pending[0][1].done()):
+                j, item = pending.popleft()
+                yield j + 1, total, _resolve(item, digest, j, fresh)
+
+        while pending:
+            j, item = pending.popleft()
+            yield j + 1, total, _resolve(item, digest, j, fresh)
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        metrics.record("pdf", feature, time.perf_counter() - start, pages=total,
+                       cached_pages=len(cached), ocr_pages=ocr_pages, bytes=len(data), error=error)
+        extracted.close()
+        for _, item in pending:
+            if isinstance(item, Future):
+                item.cancel()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        if cache is not None and fresh:
+            fresh[f"{digest}:pages"] = str(total)
+            cache.set_many(fresh)
+
+
+def _resolve(item, digest, index, fresh):
+    """Wait for an OCR future if needed and record the page for caching."""
+    if not isinstance(item, Future):
+        return item
+    try:
+        text = item.result()
+    except Exception:
+        return ""  # treat a failed OCR page as empty, but don't cache it
+    fresh[f"{digest}:{index}"] = text
+    return text
+
+
+def extract_text(source, on_page=None, feature=None):
+    """Extract the full text of a PDF.
+
+    `on_page(done, total)` is called after each page. Non-empty pages are
+    joined once, separated by blank lines.
+    """
+    parts = []
+    for page_no, total, text in iter_pdf_pages(source, feature=feature):
+        text = text.strip()
+        if text:
+            parts.append(text)
+        if on_page:
+            on_page(page_no, total)
+    return "\n\n".join(parts)
@@ -0,0 +1,224 @@
+"""Persistent MCQ bank shared by every session, in `<CACHE_DIR>/question_bank.sqlite3`.
+
+Questions are stored per source document (SHA-256 of its normalized text)
+and tagged with the concept they test. Near-duplicates are rejected on the
+way in with MinHash signatures and LSH banding: a new question is compared
+only against the few stored ones that share a band bucket with it, instead
+of against the whole bank.
+
+Once a document has enough questions, quizzes are assembled from the bank
+without a model call, spread across concepts and preferring questions that
+have been served least often.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import struct
+import threading
+import time
+
+from utils.disk_cache import CACHE_DIR
+from utils.llm_cache import normalize_text
+
+NUM_PERM = 64      # MinHash signature length
+BANDS = 16         # LSH bands of NUM_PERM // BANDS rows; candidates from ~0.5 Jaccard up,
+                   # so a pair at SIMILARITY shares a bucket with probability 0.9998
+SIMILARITY = 0.8   # estimated Jaccard at or above which a question is a duplicate
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)  # fixed, so signatures stay comparable across processes
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_WORD = re.compile(r"\w+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    doc_hash TEXT NOT NULL,
+    concept TEXT NOT NULL,
+    question TEXT NOT NULL,
+    options TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    served INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS questions_doc_concept ON questions(doc_hash, concept);
+CREATE TABLE IF NOT EXISTS lsh (
+    doc_hash TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    question_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lsh_lookup ON lsh(doc_hash, band, bucket);
+"""
+
+
+def document_hash(text):
+    """Key for a source document; whitespace-only edits map to the same key."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def concept_of(q):
+    """The concept a question tests: its "concept" field, else its answer."""
+    concept = q.get("concept") or q.get("answer") or ""
+    return " ".join(_WORD.findall(str(concept).lower()))[:80] or "general"
+
+
+def signature(text):
+    """MinHash signature of the word set of `text`."""
+    hashes = [int.from_bytes(hashlib.blake2b(w.encode(), digest_size=8).digest(), "big")
+              for w in set(_WORD.findall(text.lower()))] or [0]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS]
+
+
+def _bands(sig):
+    rows = NUM_PERM // BANDS
+    # 7-byte digests fit SQLite's signed 64-bit INTEGER.
+    return [int.from_bytes(hashlib.blake2b(_pack(sig[i * rows:(i + 1) * rows]), digest_size=7).digest(), "big")
+            for i in range(BANDS)]
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def _pack(sig):
+    return struct.pack(f"<{len(sig)}Q", *sig)
+
+
+def _unpack(blob):
+    return list(struct.unpack(f"<{NUM_PERM}Q", blob))
+
+
+class QuestionBank:
+    def __init__(self, path=None):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.path = path or os.path.join(CACHE_DIR, "question_bank.sqlite3")
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        # The lsh table's layout is recorded as user_version; re-band stored
+        # signatures when BANDS has changed.
+        if conn.execute("PRAGMA user_version").fetchone()[0] != BANDS:
+            self._reindex(conn)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _reindex(self, conn):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM lsh")
+            for qid, doc_hash, blob in conn.execute("SELECT id, doc_hash, signature FROM questions").fetchall():
+                conn.executemany(
+                    "INSERT INTO lsh (doc_hash, band, bucket, question_id) VALUES (?, ?, ?, ?)",
+                    [(doc_hash, band, bucket, qid) for band, bucket in enumerate(_bands(_unpack(blob)))],
+                )
+            conn.execute(f"PRAGMA user_version = {BANDS}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _is_duplicate(self, conn, doc_hash, sig, buckets):
+        candidates = set()
+        for band, bucket in enumerate(buckets):
+            candidates.update(row[0] for row in conn.execute(
+                "SELECT question_id FROM lsh WHERE doc_hash = ? AND band = ? AND bucket = ?",
+                (doc_hash, band, bucket),
+            ))
+        for qid in candidates:
+            row = conn.execute("SELECT signature FROM questions WHERE id = ?", (qid,)).fetchone()
+            if row and similarity(sig, _unpack(row[0])) >= SIMILARITY:
+                return True
+        return False
+
+    def add(self, doc_hash, questions):
+        """Store new questions for a document; returns those that weren't duplicates."""
+        conn = self._conn()
+        added = []
+        conn.execute("BEGIN IMMEDIATE")  # concurrent sessions adding to the same document
+        try:
+            for q in questions:
+                sig = signature(q["question"])
+                buckets = _bands(sig)
+                if self._is_duplicate(conn, doc_hash, sig, buckets):
+                    continue
+                cur = conn.execute(
+                    "INSERT INTO questions (doc_hash, concept, question, options, answer, signature, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (doc_hash, concept_of(q), q["question"], json.dumps(q["options"]), q["answer"],
+                     _pack(sig), time.time()),
+                )
+                conn.executemany(
+                    "INSERT INTO lsh (doc_hash, band, bucket, question_id) VALUES (?, ?, ?, ?)",
+                    [(doc_hash, band, bucket, cur.lastrowid) for band, bucket in enumerate(buckets)],
+                )
+                added.append(q)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def count(self, doc_hash):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM questions WHERE doc_hash = ?", (doc_hash,)
+        ).fetchone()[0]
+
+    def concepts(self, doc_hash):
+        """{concept: number of questions} for a document."""
+        return dict(self._conn().execute(
+            "SELECT concept, COUNT(*) FROM questions WHERE doc_hash = ? GROUP BY concept", (doc_hash,)
+        ))
+
+    def assemble(self, doc_hash, num_questions):
+        """A quiz of `num_questions` from the bank, or [] if it holds fewer.
+
+        Concepts are taken round-robin so the quiz covers as many as
+        possible; within a concept the least-served questions come first.
+        """
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT id, concept, question, options, answer FROM questions WHERE doc_hash = ?"
+            " ORDER BY served, RANDOM()",
+            (doc_hash,),
+        ).fetchall()
+        if len(rows) < num_questions:
+            return []
+
+        by_concept = {}
+        for row in rows:
+            by_concept.setdefault(row[1], []).append(row)
+        groups = list(by_concept.values())
+        random.shuffle(groups)
+        picked = []
+        depth = 0
+        while len(picked) < num_questions:
+            for group in groups:
+                if depth < len(group) and len(picked) < num_questions:
+                    picked.append(group[depth])
+            depth += 1
+
+        conn.executemany("UPDATE questions SET served = served + 1 WHERE id = ?", [(r[0],) for r in picked])
+        return [{"question": q, "options": json.loads(options), "answer": answer, "concept": concept}
+                for _, concept, q, options, answer in picked]
+
+
+_bank = None
+
+
+def bank():
+    global _bank
+    if _bank is None:
+        _bank = QuestionBank()
+    return _bank
@@ -0,0 +1,143 @@
+"""MCQ generation for the Quiz Generator.
+
+Small quizzes are one call, as before. Large ones (e.g. a 50-question
+practice exam from a chapter) split the source into topic-coherent chunks,
+ask for questions from every chunk concurrently, then de-duplicate and
+balance the merged set across chunks up to the requested count
+(utils/fan_out.py).
+
+Answers are streamed and parsed incrementally (utils/json_stream.py), so
+each question is available as soon as the model has finished writing it,
+and a truncated or partly malformed answer still gives up its valid
+questions.
+"""
+import re
+
+from utils import fan_out, gemini_client, scheduler
+from utils.chunking import estimate_tokens, split_into_chunks
+from utils.json_stream import JsonArrayStream, parse_array
+
+SINGLE_CALL_MAX = 10   # questions a single prompt reliably returns
+CHUNK_TOKENS = 2500
+MAX_WORKERS = 6
+OVERSAMPLE = 1.3       # ask for extra so de-duplication doesn't leave gaps
+SIMILARITY = 0.8       # token Jaccard above which two questions are duplicates
+
+QUIZ_PROMPT = """
+You are an expert MCQ Quiz Generator.
+Generate exactly {num_questions} multiple-choice questions from the text below.
+
+TEXT:
+{text}
+
+INSTRUCTIONS:
+- Output MUST be valid JSON only.
+- NO markdown.
+- NO commentary.
+- JSON must have a top-level key "questions".
+- Each question must include:
+    "question": string
+    "options": list of 4 strings
+    "answer": string (must be exactly one of the options)
+    "concept": string (the key idea the question tests, 1-3 words)
+
+RETURN ONLY THIS FORMAT:
+{{
+  "questions": [
+    {{
+      "question": "...",
+      "options": ["A", "B", "C", "D"],
+      "answer": "A",
+      "concept": "..."
+    }}
+  ]
+}}
+"""
+
+_WORD = re.compile(r"\w+")
+
+
+def parse_questions(raw):
+    """Every question dict recoverable from a model answer, fenced or not."""
+    return parse_array(raw, "questions")
+
+
+def is_valid(q):
+    """True for a question with text, 4 distinct options and an answer among them."""
+    if not isinstance(q, dict) or not isinstance(q.get("question"), str) or not q["question"].strip():
+        return False
+    options = q.get("options")
+    if not isinstance(options, list) or len(options) != 4 or len(set(map(str, options))) != 4:
+        return False
+    return q.get("answer") in options
+
+
+def _words(question):
+    return frozenset(_WORD.findall(question.lower()))
+
+
+def dedupe(questions, seen=None):
+    """Drop invalid questions and near-duplicates (by question wording)."""
+    seen = [] if seen is None else seen
+    kept = []
+    for q in questions:
+        if not is_valid(q):
+            continue
+        words = _words(q["question"])
+        if any(len(words & other) / max(1, len(words | other)) >= SIMILARITY for other in seen):
+            continue
+        seen.append(words)
+        kept.append(q)
+    return kept
+
+
+def _ask(text, count, model_name, api_key, charge, feature):
+    """Yield each question of one streamed answer as soon as it is complete."""
+    prompt = QUIZ_PROMPT.format(num_questions=count, text=text)
+    parser = JsonArrayStream("questions")
+    chunks = gemini_client.generate_stream(
+        prompt, model_name=model_name, api_key=api_key, priority=scheduler.BULK, feature=feature,
+        charge=charge,
+    )
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+
+
+def stream_questions(text, num_questions=5, model_name=gemini_client.DEFAULT_MODEL, api_key=None,
+                     user_id=None):
+    """Yield up to `num_questions` validated, de-duplicated MCQs as they arrive.
+
+    Errors from a single-call quiz are raised after the questions that came
+    before them; in a chunked quiz a failing chunk is skipped, but
+    scheduler.RateLimited is raised. The whole quiz costs `user_id` one
+    request, however many chunks it is asked from (see scheduler.Charge).
+    """
+    charge = scheduler.Charge(user_id)
+    seen = []
+
+    def fresh(q):
+        kept = dedupe([q], seen)
+        return kept[0] if kept else None
+
+    if num_questions <= SINGLE_CALL_MAX and estimate_tokens(text) <= CHUNK_TOKENS * 2:
+        count = 0
+        for q in _ask(text, num_questions, model_name, api_key, charge, "quiz.generate"):
+            q = fresh(q)
+            if q:
+                yield q
+                count += 1
+                if count == num_questions:
+                    return
+        return
+
+    yield from fan_out.gather(
+        split_into_chunks(text, CHUNK_TOKENS), num_questions,
+        lambda chunk, quota: _ask(chunk, quota, model_name, api_key, charge, "quiz.chunk"),
+        fresh, OVERSAMPLE, MAX_WORKERS,
+    )
+
+
+def generate_questions(text, num_questions=5, model_name=gemini_client.DEFAULT_MODEL, api_key=None,
+                       user_id=None):
+    """Return up to `num_questions` validated, de-duplicated MCQs from `text`."""
+    return list(stream_questions(text, num_questions, model_name, api_key, user_id))
@@ -0,0 +1,172 @@
+"""Retries, model fallback and hedged requests for upstream model calls.
+
+* Transient errors (5xx, timeouts, dropped connections) are retried with
+  full-jitter exponential backoff, all within one overall deadline.
+* When a model is overloaded (503/429) the call moves straight on to the
+  next model in its fallback chain.
+* Once enough latencies have been seen for a model, a call that runs past
+  that model's p95 gets a hedged duplicate; whichever finishes first wins.
+  Duplicates run on a small pool of their own and are skipped when it is
+  busy, or when the scheduler has a backlog (a duplicate would only queue
+  behind it), so hedging never holds up a first attempt.
+
+Latencies are recorded by the caller around the upstream request alone
+(`latency.record`), so time spent queueing in the scheduler doesn't raise
+the p95.
+"""
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from google.api_core import exceptions as api_exceptions
+
+from utils import scheduler
+
+MAX_ATTEMPTS = 3        # per model in the chain
+BASE_DELAY = 0.5        # seconds; doubled on every retry, then jittered
+MAX_DELAY = 8.0
+DEADLINE = 90.0         # seconds for the whole call, fallbacks included
+HEDGE_MIN_SAMPLES = 20  # latencies needed before hedging a model
+HEDGE_MIN_DELAY = 2.0   # never hedge sooner than this
+HEDGE_WORKERS = 8       # duplicates in flight at once; more are skipped, never queued
+
+# Next models to try when one is overloaded. Override with
+# NEXSTUDY_MODEL_FALLBACKS="gemini-2.5-pro>gemini-2.5-flash>gemini-2.0-flash;..."
+FALLBACKS = {
+    "gemini-2.5-pro": ["gemini-2.5-flash", "gemini-2.0-flash"],
+    "gemini-2.5-flash": ["gemini-2.0-flash"],
+    "gemini-2.0-flash": ["gemini-2.0-flash-lite"],
+}
+for _chain in filter(None, os.environ.get("NEXSTUDY_MODEL_FALLBACKS", "").split(";")):
+    _head, *_rest = [m.strip() for m in _chain.split(">")]
+    FALLBACKS[_head] = _rest
+
+OVERLOADED = (api_exceptions.ServiceUnavailable, api_exceptions.TooManyRequests)
+TRANSIENT = OVERLOADED + (
+    api_exceptions.InternalServerError,
+    api_exceptions.GatewayTimeout,
+    TimeoutError,
+    ConnectionError,
+)
+
+_hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+_hedge_slots = threading.BoundedSemaphore(HEDGE_WORKERS)
+
+
+def model_chain(model_name):
+    return [model_name, *FALLBACKS.get(model_name, [])]
+
+
+def backoff(attempt):
+    """Full-jitter delay before retry number `attempt` (0-based)."""
+    return random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+
+
+class LatencyTracker:
+    """Recent successful call latencies per model."""
+
+    def __init__(self, size=200):
+        self._samples = defaultdict(lambda: deque(maxlen=size))
+        self._lock = threading.Lock()
+
+    def record(self, model_name, seconds):
+        with self._lock:
+            self._samples[model_name].append(seconds)
+
+    def p95(self, model_name):
+        """95th percentile latency, or None until there are enough samples."""
+        with self._lock:
+            samples = sorted(self._samples[model_name])
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[int(0.95 * (len(samples) - 1))]
+
+
+latency = LatencyTracker()
+
+
+def _primary(attempt, model_name, timeout):
+    """Start attempt(model_name, timeout) at once on a thread of its own; returns its Future.
+
+    Primaries are never queued behind other calls, so a busy hedge pool
+    can't delay them.
+    """
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(attempt(model_name, timeout))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="llm-call", daemon=True).start()
+    return future
+
+
+def _duplicate(attempt, model_name, timeout):
+    """Submit a hedged duplicate if a hedge worker is free, else return None."""
+    if not _hedge_slots.acquire(blocking=False):
+        return None
+    future = _hedge_pool.submit(attempt, model_name, timeout)
+    future.add_done_callback(lambda _: _hedge_slots.release())
+    return future
+
+
+def _backlogged():
+    """True while calls are waiting in the scheduler, so a duplicate would queue too."""
+    return scheduler.scheduler.queued() > 0 or scheduler.scheduler.estimate_wait() > 0
+
+
+def _hedged(attempt, model_name, timeout):
+    """Run attempt(model_name, timeout); past the model's p95, race a duplicate."""
+    p95 = latency.p95(model_name)
+    if p95 is None:
+        return attempt(model_name, timeout)
+
+    start = time.monotonic()
+    pending = {_primary(attempt, model_name, timeout)}
+    done, pending = wait(pending, timeout=max(p95, HEDGE_MIN_DELAY))
+    if not done and not _backlogged():
+        duplicate = _duplicate(attempt, model_name, timeout - (time.monotonic() - start))
+        if duplicate is not None:
+            pending.add(duplicate)
+    error = None
+    while True:
+        for future in done:
+            if future.exception() is None:
+                return future.result()  # the slower twin finishes in the background
+            error = future.exception()
+        if not pending:
+            raise error
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+
+def call(attempt, model_name, deadline=DEADLINE, hedge=False):
+    """Return attempt(model, timeout) for the first model in the chain that succeeds.
+
+    `attempt` takes a model name and the seconds left before `deadline`,
+    which it must not run past. Non-transient errors propagate at once; if
+    every model fails, the last transient error is raised.
+    """
+    end = time.monotonic() + deadline
+    chain = model_chain(model_name)
+    last_error = None
+    for model in chain:
+        for n in range(MAX_ATTEMPTS):
+            try:
+                timeout = end - time.monotonic()
+                return _hedged(attempt, model, timeout) if hedge else attempt(model, timeout)
+            except TRANSIENT as e:
+                last_error = e
+                if isinstance(e, OVERLOADED) and model != chain[-1]:
+                    break  # don't wait on a busy model while others are available
+                delay = backoff(n)
+                if n + 1 == MAX_ATTEMPTS or time.monotonic() + delay >= end:
+                    break
+                time.sleep(delay)
+        if time.monotonic() >= end:
+            break
+    raise last_error
@@ -0,0 +1,216 @@
+"""Durable per-user quiz results with precomputed aggregates.
+
+Every submitted quiz is appended to the student's own log,
+`<CACHE_DIR>/results/<user>.log`, as one fixed-size 16-byte row
+(timestamp, correct, total, score). Rows are never rewritten. Appends
+reach the OS immediately; fsync is batched by a background thread every
+FSYNC_INTERVAL seconds so a burst of submissions costs one disk flush.
+
+Alongside the log, SQLite keeps running totals per user and per day,
+updated with one upsert each per submission. Dashboards read those
+instead of scanning history, so they stay O(1) however many attempts a
+student has made. If the totals ever fall behind the log (e.g. a crash
+between the two writes), they are rebuilt from it on the next read.
+"""
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from utils.disk_cache import CACHE_DIR
+
+FSYNC_INTERVAL = 1.0   # seconds between batched fsyncs
+MAX_OPEN_LOGS = 64     # append descriptors kept open, least recently used closed first
+ROW = struct.Struct("<dHHf")  # timestamp, correct, total, score (%)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS totals (
+    user_id TEXT PRIMARY KEY,
+    attempts INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    questions INTEGER NOT NULL,
+    score_sum REAL NOT NULL,
+    best REAL NOT NULL,
+    last_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    questions INTEGER NOT NULL,
+    score_sum REAL NOT NULL,
+    PRIMARY KEY (user_id, day)
+);
+"""
+
+
+def day_of(ts):
+    return time.strftime("%Y-%m-%d", time.localtime(ts))
+
+
+class ResultsStore:
+    def __init__(self, root=None):
+        self.root = root or os.path.join(CACHE_DIR, "results")
+        os.makedirs(self.root, exist_ok=True)
+        self.path = os.path.join(self.root, "aggregates.sqlite3")
+        self._local = threading.local()
+        self._dirty = set()         # log paths written since the last fsync
+        self._fds = OrderedDict()   # log path -> append-only descriptor, in LRU order
+        self._lock = threading.Lock()
+        self._conn().executescript(_SCHEMA)
+        threading.Thread(target=self._sync_loop, name="results-fsync", daemon=True).start()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _log_path(self, user_id):
+        # User ids are arbitrary strings; hash them into safe file names.
+        return os.path.join(self.root, hashlib.sha256(user_id.encode()).hexdigest()[:32] + ".log")
+
+    def _append(self, user_id, row):
+        """Append one row to the user's log, reusing a recently used descriptor."""
+        path = self._log_path(user_id)
+        with self._lock:  # also keeps the descriptor from being closed mid-write
+            fd = self._fds.pop(path, None)
+            if fd is None:
+                fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                while len(self._fds) >= MAX_OPEN_LOGS:
+                    os.close(self._fds.popitem(last=False)[1])  # its path stays dirty until synced
+            self._fds[path] = fd
+            os.write(fd, row)  # O_APPEND: one whole row per write
+            self._dirty.add(path)
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(FSYNC_INTERVAL)
+            self.sync()
+
+    def sync(self):
+        """fsync every log written since the last call."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        for path in dirty:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError:
+                pass
+
+    def record(self, user_id, correct, total, ts=None):
+        """Append one quiz result and update the running totals."""
+        ts = time.time() if ts is None else ts
+        score = round(100 * correct / total, 2) if total else 0.0
+        conn = self._conn()
+        # The log row is written inside the transaction, so a reader never sees
+        # totals ahead of the log, and one behind it only until the commit.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._append(user_id, ROW.pack(ts, correct, total, score))
+            self._apply(conn, user_id, ts, correct, total, score)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _apply(self, conn, user_id, ts, correct, total, score):
+        conn.execute(
+            "INSERT INTO totals VALUES (?, 1, ?, ?, ?, ?, ?) ON CONFLICT(user_id) DO UPDATE SET "
+            "attempts = attempts + 1, correct = correct + excluded.correct, "
+            "questions = questions + excluded.questions, score_sum = score_sum + excluded.score_sum, "
+            "best = MAX(best, excluded.best), last_at = MAX(last_at, excluded.last_at)",
+            (user_id, correct, total, score, score, ts),
+        )
+        conn.execute(
+            "INSERT INTO daily VALUES (?, ?, 1, ?, ?, ?) ON CONFLICT(user_id, day) DO UPDATE SET "
+            "attempts = attempts + 1, correct = correct + excluded.correct, "
+            "questions = questions + excluded.questions, score_sum = score_sum + excluded.score_sum",
+            (user_id, day_of(ts), correct, total, score),
+        )
+
+    def _attempts(self, conn, user_id):
+        row = conn.execute("SELECT attempts FROM totals WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def _logged_rows(self, user_id):
+        try:
+            return os.path.getsize(self._log_path(user_id)) // ROW.size
+        except FileNotFoundError:
+            return 0
+
+    def history(self, user_id, limit=None):
+        """Logged results as (ts, correct, total, score), oldest first; the last `limit` only."""
+        try:
+            with open(self._log_path(user_id), "rb") as f:
+                rows = os.fstat(f.fileno()).st_size // ROW.size
+                skip = max(0, rows - limit) if limit else 0
+                f.seek(skip * ROW.size)
+                data = f.read((rows - skip) * ROW.size)
+        except FileNotFoundError:
+            return []
+        return list(ROW.iter_unpack(data))
+
+    def rebuild(self, user_id):
+        """Recompute a user's totals and daily rollups from their log if they disagree."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")  # waits out any record() in progress
+        try:
+            if self._attempts(conn, user_id) != self._logged_rows(user_id):
+                conn.execute("DELETE FROM totals WHERE user_id = ?", (user_id,))
+                conn.execute("DELETE FROM daily WHERE user_id = ?", (user_id,))
+                for ts, correct, total, score in self.history(user_id):
+                    self._apply(conn, user_id, ts, correct, total, score)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def summary(self, user_id):
+        """{"attempts", "accuracy", "correct", "questions", "best", "last_at"} for a user."""
+        query = "SELECT attempts, correct, questions, score_sum, best, last_at FROM totals WHERE user_id = ?"
+        row = self._conn().execute(query, (user_id,)).fetchone()
+        if (row[0] if row else 0) != self._logged_rows(user_id):
+            self.rebuild(user_id)
+            row = self._conn().execute(query, (user_id,)).fetchone()
+        if row is None:
+            return {"attempts": 0, "accuracy": 0.0, "correct": 0, "questions": 0, "best": 0.0, "last_at": None}
+        attempts, correct, questions, score_sum, best, last_at = row
+        return {
+            "attempts": attempts,
+            "accuracy": round(score_sum / attempts, 2),
+            "correct": correct,
+            "questions": questions,
+            "best": best,
+            "last_at": last_at,
+        }
+
+    def daily(self, user_id, since_day=None):
+        """[(day, attempts, accuracy)] in date order, from `since_day` ("YYYY-MM-DD") on."""
+        rows = self._conn().execute(
+            "SELECT day, attempts, score_sum FROM daily WHERE user_id = ? AND day >= ? ORDER BY day",
+            (user_id, since_day or ""),
+        ).fetchall()
+        return [(day, attempts, round(score_sum / attempts, 2)) for day, attempts, score_sum in rows]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def results():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultsStore()
+        return _store
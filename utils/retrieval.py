@@ -0,0 +1,181 @@
+"""Per-document BM25 retrieval, so chat prompts carry excerpts instead of whole PDFs.
+
+A document is split into small chunks once and indexed as a sparse
+chunk x term matrix of precomputed BM25 weights (SciPy CSR). Scoring a
+question is one sparse matrix-vector product, O(non-zeros), and only the
+top-k chunks go into the prompt, so its size stays flat however long the
+document is.
+
+Indexes are saved to `<CACHE_DIR>/retrieval/<document hash>.npz` and kept
+in a small in-process LRU, so re-uploading a PDF, or asking another
+question about it, never re-indexes it. The files are kept under
+INDEX_MAX_BYTES by deleting the least recently used (by mtime, which every
+use refreshes) after each new index is saved.
+"""
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.chunking import estimate_tokens, split_into_chunks
+from utils.disk_cache import CACHE_DIR
+from utils.question_bank import document_hash
+
+CHUNK_TOKENS = 250
+TOP_K = 6
+CONTEXT_TOKENS = 1800  # documents below this are sent whole
+K1 = 1.5
+B = 0.75
+MAX_INDEXES = 16       # loaded indexes kept in memory
+INDEX_MAX_BYTES = 128 * 1024 * 1024  # index files kept on disk
+
+INDEX_DIR = os.path.join(CACHE_DIR, "retrieval")
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from had has have how i in is it its of on or so that the
+their then there these this to was were what when where which who why will with you your
+""".split())
+
+_lock = threading.Lock()
+_loaded = OrderedDict()  # doc hash -> Index
+
+
+def _terms(text):
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+
+
+class Index:
+    def __init__(self, chunks, vocabulary, weights):
+        self.chunks = chunks
+        self.vocabulary = vocabulary  # term -> column
+        self.weights = weights        # CSR, chunks x terms
+
+    @classmethod
+    def build(cls, text):
+        from scipy import sparse  # only needed once a PDF is too long to send whole
+
+        chunks = split_into_chunks(text, CHUNK_TOKENS)
+        vocabulary = {}
+        rows, cols = [], []
+        for i, chunk in enumerate(chunks):
+            for term in _terms(chunk):
+                cols.append(vocabulary.setdefault(term, len(vocabulary)))
+                rows.append(i)
+        tf = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(chunks), len(vocabulary))
+        )  # duplicate (chunk, term) pairs are summed into counts
+
+        lengths = np.asarray(tf.sum(axis=1)).ravel()
+        df = np.bincount(tf.indices, minlength=len(vocabulary))
+        idf = np.log1p((len(chunks) - df + 0.5) / (df + 0.5))
+        row_of = np.repeat(np.arange(len(chunks)), np.diff(tf.indptr))
+        norm = K1 * (1 - B + B * lengths / max(lengths.mean(), 1.0)) if len(chunks) else lengths
+        tf.data = (idf[tf.indices] * tf.data * (K1 + 1) / (tf.data + norm[row_of])).astype(np.float32)
+        return cls(chunks, vocabulary, tf)
+
+    def search(self, query, k=TOP_K):
+        """Indices of the `k` chunks most relevant to `query`, in document order.
+
+        With no matching terms, the opening chunks are returned.
+        """
+        columns = [self.vocabulary[t] for t in _terms(query) if t in self.vocabulary]
+        if not columns:
+            return list(range(min(k, len(self.chunks))))
+        q = np.bincount(columns, minlength=len(self.vocabulary)).astype(np.float32)
+        scores = self.weights @ q
+        k = min(k, int(np.count_nonzero(scores)))
+        if not k:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        return sorted(top.tolist())
+
+    def save(self, path):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(
+                f, data=self.weights.data, indices=self.weights.indices, indptr=self.weights.indptr,
+                shape=np.array(self.weights.shape), vocabulary=np.array("\n".join(self.vocabulary)),
+                chunks=np.array(json.dumps(self.chunks)),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        from scipy import sparse
+
+        with np.load(path, allow_pickle=False) as z:
+            weights = sparse.csr_matrix((z["data"], z["indices"], z["indptr"]), shape=tuple(z["shape"]))
+            terms = str(z["vocabulary"])
+            vocabulary = {t: i for i, t in enumerate(terms.split("\n"))} if terms else {}
+            return cls(json.loads(str(z["chunks"])), vocabulary, weights)
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _prune():
+    """Delete the least recently used index files while they exceed INDEX_MAX_BYTES."""
+    files = []
+    try:
+        with os.scandir(INDEX_DIR) as entries:
+            for entry in entries:
+                if entry.name.endswith(".npz"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= INDEX_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def index_for(text):
+    """The retrieval index of `text`, built at most once per document."""
+    key = document_hash(text)
+    path = os.path.join(INDEX_DIR, key + ".npz")
+    with _lock:
+        index = _loaded.get(key)
+        if index is not None:
+            _loaded.move_to_end(key)
+    if index is not None:
+        _touch(path)  # keeps the file off the eviction list while it is in use
+        return index
+    try:
+        index = Index.load(path)
+        _touch(path)
+    except (OSError, ValueError, KeyError):
+        index = Index.build(text)
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        index.save(path)
+        _prune()
+    with _lock:
+        _loaded[key] = index
+        while len(_loaded) > MAX_INDEXES:
+            _loaded.popitem(last=False)
+    return index
+
+
+def context(text, query, k=TOP_K):
+    """Prompt text with the parts of a document relevant to `query`.
+
+    Short documents are returned whole; longer ones as their top-k excerpts.
+    """
+    if estimate_tokens(text) <= CONTEXT_TOKENS:
+        return f"PDF Context:\n{text}"
+    index = index_for(text)
+    excerpts = "\n\n".join(f"[Excerpt {n}]\n{index.chunks[i]}" for n, i in enumerate(index.search(query, k), 1))
+    return f"PDF Context (the excerpts most relevant to the question):\n{excerpts}"
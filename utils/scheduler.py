@@ -0,0 +1,253 @@
+"""Rate limiting and fair scheduling in front of every Gemini call.
+
+Two layers:
+
+* Per-user token buckets, persisted in SQLite so a student's allowance
+  survives new tabs and server restarts (replaces the old per-session
+  DAILY_LIMIT counter).
+* A process-wide scheduler that keeps all upstream calls under the shared
+  requests-per-minute and tokens-per-minute budget. Callers queue by
+  priority, so interactive chat goes ahead of bulk quiz generation, and
+  can ask for the expected wait before they start.
+"""
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+
+from utils.disk_cache import CACHE_DIR
+
+# Priorities: lower runs first.
+INTERACTIVE = 0
+STANDARD = 5
+BULK = 10
+
+RPM = int(os.environ.get("NEXSTUDY_GEMINI_RPM", 60))
+TPM = int(os.environ.get("NEXSTUDY_GEMINI_TPM", 1_000_000))
+OUTPUT_TOKEN_ALLOWANCE = 500   # expected answer size, charged up front
+
+USER_CAPACITY = 50             # burst size of a user's bucket
+USER_REFILL_PER_DAY = 50       # sustained requests per user per day
+
+
+class RateLimited(Exception):
+    """A user's bucket is empty; `retry_after` is seconds until the next token."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limit reached. Try again in {format_wait(retry_after)}.")
+        self.retry_after = retry_after
+
+
+def format_wait(seconds):
+    if seconds < 90:
+        return f"{max(1, round(seconds))}s"
+    if seconds < 5400:
+        return f"{round(seconds / 60)} min"
+    return f"{seconds / 3600:.1f} h"
+
+
+# ---------------- PER-USER BUCKETS ----------------
+class UserBuckets:
+    """Token buckets keyed by user id, stored in `<CACHE_DIR>/user_buckets.sqlite3`."""
+
+    def __init__(self, capacity=USER_CAPACITY, refill_per_day=USER_REFILL_PER_DAY):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.path = os.path.join(CACHE_DIR, "user_buckets.sqlite3")
+        self.capacity = capacity
+        self.rate = refill_per_day / 86400.0  # tokens per second
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "user_id TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _level(self, conn, user_id, now):
+        row = conn.execute(
+            "SELECT tokens, updated_at FROM buckets WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return float(self.capacity)
+        tokens, updated_at = row
+        return min(self.capacity, tokens + (now - updated_at) * self.rate)
+
+    def remaining(self, user_id):
+        """Whole tokens currently available to `user_id`."""
+        return int(self._level(self._conn(), user_id, time.time()))
+
+    def take(self, user_id, cost=1):
+        """Spend `cost` tokens or raise RateLimited."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")  # serialize concurrent tabs/processes
+        try:
+            tokens = self._level(conn, user_id, now)
+            if tokens < cost:
+                raise RateLimited((cost - tokens) / self.rate)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (user_id, tokens, updated_at) VALUES (?, ?, ?)",
+                (user_id, tokens - cost, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return int(tokens - cost)
+
+    def refund(self, user_id, cost=1):
+        """Give back `cost` tokens taken for a call that never completed."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            tokens = min(self.capacity, self._level(conn, user_id, now) + cost)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (user_id, tokens, updated_at) VALUES (?, ?, ?)",
+                (user_id, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class Charge:
+    """One user action's claim on their bucket, however many model calls it makes.
+
+    A chunked quiz, a map-reduce summary or a chat answer plus its memory
+    fold all cost the student one request. The first call of the action that
+    reaches the model takes it; if every call that reached the model failed,
+    it is given back once none is still in flight. Cached answers are free.
+    Without a `user_id` nothing is charged.
+    """
+
+    def __init__(self, user_id, cost=1):
+        self.user_id, self.cost = user_id, cost
+        self._lock = threading.Lock()
+        self._taken = False   # the request is currently held
+        self._used = False    # some call succeeded, so it is spent for good
+        self._active = 0      # calls between take() and settle()
+
+    def take(self):
+        """Claim the request before a call goes upstream; raises RateLimited."""
+        if not self.user_id:
+            return
+        with self._lock:
+            if not self._taken:
+                user_buckets().take(self.user_id, self.cost)
+                self._taken = True
+            self._active += 1
+
+    def settle(self, used):
+        """End a call that take() let through; `used` if it got an answer from the model."""
+        if not self.user_id:
+            return
+        with self._lock:
+            self._active -= 1
+            self._used = self._used or used
+            if self._taken and not self._used and not self._active:
+                user_buckets().refund(self.user_id, self.cost)
+                self._taken = False
+
+
+# ---------------- GLOBAL SCHEDULER ----------------
+class Scheduler:
+    """Priority queue gated by requests-per-minute and tokens-per-minute buckets."""
+
+    def __init__(self, rpm=RPM, tpm=TPM):
+        self.rpm, self.tpm = rpm, tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._queue = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _budget_wait(self, tokens, now):
+        """Seconds until the budget can cover one request of `tokens`."""
+        tokens = min(tokens, self.tpm)
+        wait = max(0.0, self._paused_until - now)
+        if self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+        if self._tokens < tokens:
+            wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+        return wait
+
+    def estimate_wait(self, priority=INTERACTIVE, tokens=OUTPUT_TOKEN_ALLOWANCE):
+        """Rough seconds a new request at `priority` would wait right now."""
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            ahead = sum(1 for p, _ in self._queue if p <= priority)
+            # Each request ahead consumes one request slot at the sustained rate.
+            backlog = max(0.0, ahead + 1 - self._requests) * 60 / self.rpm
+            return max(backlog, self._budget_wait(tokens, now))
+
+    def queued(self):
+        with self._cond:
+            return len(self._queue)
+
+    def acquire(self, priority=INTERACTIVE, tokens=OUTPUT_TOKEN_ALLOWANCE, timeout=None):
+        """Block until this request may go upstream, then charge the budget."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        tokens = min(tokens, self.tpm)
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = self._budget_wait(tokens, now)
+                    if self._queue[0] == ticket and wait == 0:
+                        heapq.heappop(self._queue)
+                        self._requests -= 1
+                        self._tokens -= tokens
+                        self._cond.notify_all()
+                        return
+                    if deadline is not None:
+                        if now >= deadline:
+                            raise TimeoutError("Timed out waiting for a Gemini request slot.")
+                        wait = min(wait or deadline - now, deadline - now)
+                    # Not our turn: sleep until notified (or until the budget refills).
+                    self._cond.wait(wait or None)
+            except BaseException:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    heapq.heapify(self._queue)
+                    self._cond.notify_all()
+                raise
+
+    def pause(self, seconds):
+        """Hold all dispatch for `seconds`, e.g. after an upstream 429."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+
+scheduler = Scheduler()
+_user_buckets = None
+
+
+def user_buckets():
+    global _user_buckets
+    if _user_buckets is None:
+        _user_buckets = UserBuckets()
+    return _user_buckets
@@ -0,0 +1,64 @@
+"""Coalesce identical in-flight model calls.
+
+All Streamlit sessions run as threads of one server process. When a whole
+class opens the same page and asks the same thing at once, the first caller
+(the leader) makes the upstream request and everyone else with the same key
+waits for and shares its result.
+"""
+import threading
+
+_lock = threading.Lock()
+_calls = {}  # key -> _Call
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self, timeout=None):
+        """Block until the leader finishes; return its result or raise its error."""
+        if not self.done.wait(timeout):
+            raise TimeoutError("Timed out waiting for an identical request in flight.")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def begin(key):
+    """Join the call for `key`. Returns (call, is_leader).
+
+    The leader must call finish(); everyone else calls call.wait().
+    """
+    with _lock:
+        call = _calls.get(key)
+        if call is not None:
+            return call, False
+        call = _calls[key] = _Call()
+        return call, True
+
+
+def finish(key, call, result=None, error=None):
+    """Publish the leader's outcome and release the waiters."""
+    call.result, call.error = result, error
+    with _lock:
+        if _calls.get(key) is call:
+            del _calls[key]
+    call.done.set()
+
+
+def do(key, fn, timeout=None):
+    """Run fn() once for all concurrent callers with the same key."""
+    call, leader = begin(key)
+    if not leader:
+        return call.wait(timeout)
+    try:
+        result = fn()
+    except BaseException as e:
+        finish(key, call, error=e)
+        raise
+    finish(key, call, result=result)
+    return result
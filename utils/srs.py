@@ -0,0 +1,287 @@
+"""Spaced-repetition flashcards: SM-2 scheduling over a heap of due dates.
+
+Each user's deck lives in `<CACHE_DIR>/flashcards.sqlite3` and is loaded
+into memory on first use. Loading a deck drops the least recently used
+ones while the process holds more than MAX_CACHED_CARDS cards. Cards are small `__slots__` objects, and a
+binary heap of (due, card id) answers "what's next?" in O(log n):
+
+- `next_due()` peeks at the heap top, discarding stale entries left behind
+  by earlier reviews (lazy deletion, amortized O(log n)).
+- `grade()` reschedules with SM-2, pushes one new heap entry (O(log n))
+  and writes one row.
+
+Stale entries are compacted away once they outnumber live cards, so the
+heap stays within 2x the deck size. Fronts are also indexed by `card_key`,
+so a card already in the deck is rejected in O(1) when added again.
+"""
+import heapq
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from utils.disk_cache import CACHE_DIR
+
+DAY = 86400
+RELEARN_DELAY = 10 * 60   # a failed card comes back after ten minutes
+MIN_EASE = 1.3
+START_EASE = 2.5
+MAX_CACHED_CARDS = 200_000  # cards kept in memory across all cached decks
+
+# Review buttons and their SM-2 quality (0-5).
+GRADES = {"Again": 1, "Hard": 3, "Good": 4, "Easy": 5}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    front TEXT NOT NULL,
+    back TEXT NOT NULL,
+    ease REAL NOT NULL,
+    interval REAL NOT NULL,
+    reps INTEGER NOT NULL,
+    lapses INTEGER NOT NULL,
+    due REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cards_user ON cards(user_id);
+"""
+
+
+_WORD = re.compile(r"\w+")
+
+
+def card_key(front):
+    """Duplicate-detection key of a card: the words of its front, case-folded."""
+    return " ".join(_WORD.findall(front.casefold()))
+
+
+class Card:
+    __slots__ = ("id", "front", "back", "ease", "interval", "reps", "lapses", "due")
+
+    def __init__(self, id, front, back, ease=START_EASE, interval=0.0, reps=0, lapses=0, due=0.0):
+        self.id = id
+        self.front = front
+        self.back = back
+        self.ease = ease
+        self.interval = interval  # days
+        self.reps = reps
+        self.lapses = lapses
+        self.due = due
+
+
+def sm2(card, quality, now):
+    """Apply one SM-2 review with `quality` 0-5 to `card` in place."""
+    if quality < 3:
+        card.reps = 0
+        card.lapses += 1
+        card.interval = 1.0
+        card.due = now + RELEARN_DELAY
+    else:
+        if card.reps == 0:
+            card.interval = 1.0
+        elif card.reps == 1:
+            card.interval = 6.0
+        else:
+            card.interval = round(card.interval * card.ease, 1)
+        card.reps += 1
+        card.due = now + card.interval * DAY
+    card.ease = max(MIN_EASE, card.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+
+class Deck:
+    """One user's cards plus their due-date heap."""
+
+    def __init__(self, store, user_id, cards):
+        self._store = store
+        self.user_id = user_id
+        self.cards = {c.id: c for c in cards}
+        self._keys = {}  # card_key(front) -> number of cards with it
+        for c in cards:
+            self._count_key(c, 1)
+        self._heap = [(c.due, c.id) for c in cards]
+        heapq.heapify(self._heap)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.cards)
+
+    def _count_key(self, card, delta):
+        key = card_key(card.front)
+        left = self._keys.get(key, 0) + delta
+        if left > 0:
+            self._keys[key] = left
+        else:
+            self._keys.pop(key, None)
+
+    def keys(self):
+        """Live view of the card_keys in the deck, for O(1) duplicate checks."""
+        return self._keys.keys()
+
+    def _live(self, entry):
+        card = self.cards.get(entry[1])
+        return card is not None and card.due == entry[0]
+
+    def _push(self, card):
+        heapq.heappush(self._heap, (card.due, card.id))
+        if len(self._heap) > 2 * len(self.cards) + 64:
+            self._heap = [(c.due, c.id) for c in self.cards.values()]
+            heapq.heapify(self._heap)
+
+    def next_due(self, now=None):
+        """The card due soonest if it is due by `now`, else None."""
+        now = time.time() if now is None else now
+        with self._lock:
+            while self._heap and not self._live(self._heap[0]):
+                heapq.heappop(self._heap)
+            if self._heap and self._heap[0][0] <= now:
+                return self.cards[self._heap[0][1]]
+        return None
+
+    def next_review_at(self):
+        """Due time of the soonest card, or None for an empty deck."""
+        with self._lock:
+            while self._heap and not self._live(self._heap[0]):
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def due_count(self, now=None, limit=999):
+        """Cards due by `now`, counted up to `limit` (walks only the due part of the heap)."""
+        now = time.time() if now is None else now
+        count = 0
+        with self._lock:
+            stack = [0] if self._heap else []
+            while stack and count < limit:
+                i = stack.pop()
+                if self._heap[i][0] > now:
+                    continue  # children are due even later
+                if self._live(self._heap[i]):
+                    count += 1
+                stack.extend(j for j in (2 * i + 1, 2 * i + 2) if j < len(self._heap))
+        return count
+
+    def grade(self, card_id, quality, now=None):
+        """Record a review of `card_id` with SM-2 `quality` (see GRADES)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            card = self.cards[card_id]
+            sm2(card, quality, now)
+            self._push(card)
+        self._store.save(self.user_id, card)
+        return card
+
+    def add(self, pairs, now=None):
+        """Add (front, back) pairs as new cards, due now; returns the new cards.
+
+        Pairs whose front is already in the deck (by `card_key`) are skipped.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            new, keys = [], set()
+            for front, back in pairs:
+                key = card_key(front)
+                if key and key not in self._keys and key not in keys:
+                    keys.add(key)
+                    new.append((front, back))
+            cards = self._store.insert(self.user_id, new, now) if new else []
+            for card in cards:
+                self.cards[card.id] = card
+                self._count_key(card, 1)
+                self._push(card)
+        return cards
+
+    def delete(self, card_id):
+        with self._lock:
+            card = self.cards.pop(card_id, None)  # its heap entries go stale
+            if card is not None:
+                self._count_key(card, -1)
+        self._store.delete(self.user_id, card_id)
+
+
+class CardStore:
+    """SQLite persistence for every user's cards, with recently used decks cached per process."""
+
+    def __init__(self, path=None):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.path = path or os.path.join(CACHE_DIR, "flashcards.sqlite3")
+        self._local = threading.local()
+        self._decks = OrderedDict()  # user_id -> Deck, least recently used first
+        self._lock = threading.Lock()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def deck(self, user_id):
+        """The user's deck, loaded from disk unless it is among the recently used ones.
+
+        Every change is written through to SQLite, so a dropped deck loses
+        nothing; it is just read again on its next use.
+        """
+        with self._lock:
+            deck = self._decks.get(user_id)
+            if deck is not None:
+                self._decks.move_to_end(user_id)
+                return deck
+            rows = self._conn().execute(
+                "SELECT id, front, back, ease, interval, reps, lapses, due FROM cards WHERE user_id = ?",
+                (user_id,),
+            )
+            deck = Deck(self, user_id, [Card(*row) for row in rows])
+            self._decks[user_id] = deck
+            held = sum(len(d) for d in self._decks.values())
+            while held > MAX_CACHED_CARDS and len(self._decks) > 1:
+                held -= len(self._decks.popitem(last=False)[1])
+            return deck
+
+    def insert(self, user_id, pairs, now):
+        conn = self._conn()
+        cards = []
+        conn.execute("BEGIN")
+        try:
+            for front, back in pairs:
+                cur = conn.execute(
+                    "INSERT INTO cards (user_id, front, back, ease, interval, reps, lapses, due, created_at)"
+                    " VALUES (?, ?, ?, ?, 0, 0, 0, ?, ?)",
+                    (user_id, front, back, START_EASE, now, now),
+                )
+                cards.append(Card(cur.lastrowid, front, back, due=now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return cards
+
+    def save(self, user_id, card):
+        self._conn().execute(
+            "UPDATE cards SET ease = ?, interval = ?, reps = ?, lapses = ?, due = ? WHERE id = ? AND user_id = ?",
+            (card.ease, card.interval, card.reps, card.lapses, card.due, card.id, user_id),
+        )
+
+    def iter_pairs(self, user_id):
+        """(front, back) of every card of a user, oldest first, streamed from disk."""
+        yield from self._conn().execute(
+            "SELECT front, back FROM cards WHERE user_id = ? ORDER BY id", (user_id,)
+        )
+
+    def delete(self, user_id, card_id):
+        self._conn().execute("DELETE FROM cards WHERE id = ? AND user_id = ?", (card_id, user_id))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def cards():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CardStore()
+        return _store
@@ -0,0 +1,144 @@
+"""Map-reduce summarization for inputs too long for one prompt.
+
+The text is split on paragraph/section boundaries into chunks that fit a
+token budget, each chunk is summarized concurrently on a bounded thread pool,
+and the partial summaries are merged in a final reduce pass. Chunk calls go
+through the shared response cache, so after an edit only the changed chunks
+and the reduce step hit the model again.
+
+Keywords can come from a second call on the summary ("sequential"), from a
+call on the source text running alongside the summary ("pipelined"), or from
+the same call as the summary as validated JSON ("fused").
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import gemini_client, scheduler
+from utils.chunking import estimate_tokens, split_into_chunks
+
+CHUNK_TOKENS = 3000    # budget per map-step chunk
+REDUCE_TOKENS = 6000   # partial summaries above this are reduced in stages
+MAX_WORKERS = 4
+
+SUMMARY_PROMPT = "Summarize the following text clearly, simply, and in bullet points:\n\n{text}"
+CHUNK_PROMPT = (
+    "Summarize this section of a longer document in concise bullet points. "
+    "Keep every key fact, definition and formula:\n\n{text}"
+)
+KEYWORD_PROMPT = "Extract 5–10 important keywords from this {source}, comma-separated:\n\n{text}"
+FUSED_INSTRUCTIONS = """
+Return ONLY valid JSON with exactly these keys:
+{"summary": "the summary as bullet points, one markdown string", "keywords": ["5-10 important keywords"]}
+"""
+JSON_CONFIG = {"response_mime_type": "application/json"}
+MODES = ("fused", "pipelined", "sequential")
+REDUCE_PROMPT = (
+    "These are bullet-point summaries of consecutive sections of one document. "
+    "Merge them into a single clear, simple bullet-point summary without repeating points:\n\n{text}"
+)
+
+
+def _call(prompt, model_name, api_key, charge, feature, **kwargs):
+    return gemini_client.generate(
+        prompt, model_name=model_name, api_key=api_key, priority=scheduler.STANDARD,
+        feature=f"summarizer.{feature}", charge=charge, **kwargs
+    ).strip()
+
+
+def _map(prompt, parts, model_name, api_key, charge, feature):
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(parts))) as pool:
+        return list(pool.map(
+            lambda part: _call(prompt.format(text=part), model_name, api_key, charge, feature), parts
+        ))
+
+
+def _partials(text, model_name, api_key, charge):
+    """Chunk summaries of `text`, reduced in stages until they fit one prompt."""
+    partials = _map(CHUNK_PROMPT, split_into_chunks(text, CHUNK_TOKENS), model_name, api_key, charge, "map")
+    # Very long documents can produce more partial text than one reduce prompt
+    # should carry; merge neighbouring groups until it fits.
+    while estimate_tokens("\n\n".join(partials)) > REDUCE_TOKENS and len(partials) > 1:
+        groups = split_into_chunks("\n\n".join(partials), REDUCE_TOKENS)
+        if len(groups) >= len(partials):
+            break
+        partials = _map(REDUCE_PROMPT, groups, model_name, api_key, charge, "reduce")
+    return partials
+
+
+def _summary(text, model_name, api_key, charge):
+    if estimate_tokens(text) <= CHUNK_TOKENS:
+        return _call(SUMMARY_PROMPT.format(text=text), model_name, api_key, charge, "summary")
+    partials = _partials(text, model_name, api_key, charge)
+    return _call(REDUCE_PROMPT.format(text="\n\n".join(partials)), model_name, api_key, charge, "reduce")
+
+
+def _keywords(text, model_name, api_key, source, charge):
+    if estimate_tokens(text) > REDUCE_TOKENS:
+        chunks = split_into_chunks(text, CHUNK_TOKENS // 4)
+        step = max(1, -(-len(chunks) * (CHUNK_TOKENS // 4) // REDUCE_TOKENS))
+        text = "\n\n".join(chunks[::step])
+    return _call(KEYWORD_PROMPT.format(source=source, text=text), model_name, api_key, charge, "keywords")
+
+
+def summarize(text, model_name=gemini_client.DEFAULT_MODEL, api_key=None, user_id=None):
+    """Bullet-point summary of `text`; long inputs are summarized map-reduce style.
+
+    However many calls it takes, it costs `user_id` one request (see scheduler.Charge).
+    """
+    return _summary(text, model_name, api_key, scheduler.Charge(user_id))
+
+
+def extract_keywords(text, model_name=gemini_client.DEFAULT_MODEL, api_key=None, source="summary",
+                     user_id=None):
+    """Comma-separated keywords for `text`. Long sources are sampled evenly."""
+    return _keywords(text, model_name, api_key, source, scheduler.Charge(user_id))
+
+
+def parse_fused(raw):
+    """Validate a fused JSON answer; returns (summary, keywords) or raises ValueError."""
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = raw.strip("`").removeprefix("json").strip()
+    data = json.loads(raw)
+    summary = data.get("summary") if isinstance(data, dict) else None
+    keywords = data.get("keywords") if isinstance(data, dict) else None
+    if isinstance(summary, list):
+        summary = "\n".join(f"- {point}" for point in summary)
+    if not isinstance(summary, str) or not summary.strip():
+        raise ValueError("fused response has no summary")
+    if not isinstance(keywords, list) or not all(isinstance(k, str) for k in keywords):
+        raise ValueError("fused response has no keyword list")
+    return summary.strip(), ", ".join(k.strip() for k in keywords if k.strip())
+
+
+def _fused(text, model_name, api_key, charge):
+    if estimate_tokens(text) <= CHUNK_TOKENS:
+        prompt = SUMMARY_PROMPT.format(text=text)
+    else:
+        prompt = REDUCE_PROMPT.format(text="\n\n".join(_partials(text, model_name, api_key, charge)))
+    raw = _call(prompt + FUSED_INSTRUCTIONS, model_name, api_key, charge, "fused", generation_config=JSON_CONFIG)
+    return parse_fused(raw)
+
+
+def summarize_with_keywords(text, mode="fused", model_name=gemini_client.DEFAULT_MODEL, api_key=None,
+                            user_id=None):
+    """Return (summary, keywords) using one of MODES.
+
+    A fused answer that fails validation falls back to the pipelined mode.
+    The whole action costs `user_id` one request.
+    """
+    charge = scheduler.Charge(user_id)
+    if mode == "fused":
+        try:
+            return _fused(text, model_name, api_key, charge)
+        except ValueError:
+            mode = "pipelined"
+
+    if mode == "pipelined":
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            summary = pool.submit(_summary, text, model_name, api_key, charge)
+            keywords = pool.submit(_keywords, text, model_name, api_key, "text", charge)
+            return summary.result(), keywords.result()
+
+    summary = _summary(text, model_name, api_key, charge)
+    return summary, _keywords(summary, model_name, api_key, "summary", charge)
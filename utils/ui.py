@@ -0,0 +1,100 @@
+"""Streamlit helpers shared by several pages."""
+import re
+import time
+import uuid
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+from utils import pdf_extract, scheduler
+
+
+# ---------------- USER IDENTITY ----------------
+USER_COOKIE = "nexstudy_uid"
+_USER_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _set_user_cookie(uid):
+    # Streamlit can read cookies but not set them; do it from the browser.
+    components.html(
+        f"<script>window.parent.document.cookie = "
+        f"'{USER_COOKIE}={uid}; max-age=31536000; path=/; SameSite=Strict';</script>",
+        height=0,
+    )
+
+
+def get_user_id():
+    """Stable id for the current student, shared by all their tabs.
+
+    A random id is kept in a cookie on first visit, so it belongs to one
+    browser: it is never derived from request headers (one user agent or
+    school NAT can stand for many students) and never read from the URL
+    (where a shared link would hand it to someone else).
+    """
+    if "user_id" in st.session_state:
+        return st.session_state.user_id
+
+    try:
+        uid = st.context.cookies.get(USER_COOKIE, "")
+    except Exception:
+        uid = ""
+    if not isinstance(uid, str) or not _USER_ID.match(uid):
+        uid = uuid.uuid4().hex
+        _set_user_cookie(uid)
+    if "uid" in st.query_params:
+        del st.query_params["uid"]  # links from older versions carried the sharer's id
+    st.session_state.user_id = uid
+    return uid
+
+
+# ---------------- SCHEDULER ----------------
+def show_estimated_wait(priority=scheduler.INTERACTIVE):
+    """Tell the user how long the shared Gemini queue will make them wait."""
+    wait = scheduler.scheduler.estimate_wait(priority)
+    if wait >= 1:
+        st.caption(
+            f"⏳ Gemini is busy: {scheduler.scheduler.queued()} request(s) queued, "
+            f"estimated wait ~{scheduler.format_wait(wait)}."
+        )
+
+
+# ---------------- PDF EXTRACTION ----------------
+def extract_text_from_pdf(uploaded_file, feature=None):
+    """Extract text from an uploaded PDF, showing per-page progress.
+
+    `feature` ("page.pdf") names the extraction in the metrics log.
+    """
+    progress = st.progress(0.0, text="📄 Reading PDF...")
+
+    def on_page(done, total):
+        progress.progress(done / total, text=f"📄 Reading page {done}/{total}...")
+
+    try:
+        return pdf_extract.extract_text(uploaded_file, on_page=on_page, feature=feature)
+    except Exception as e:
+        st.error(f"Error extracting PDF text: {e}")
+        return ""
+    finally:
+        progress.empty()
+
+
+# ---------------- STREAMING ----------------
+def stream_into(placeholder, chunks, render=None, interval=0.05):
+    """Draw text chunks into `placeholder` as they arrive; return the full text.
+
+    `render(placeholder, text)` draws the text so far (markdown by default).
+    Redraws are throttled to one per `interval` seconds, plus a final one.
+    """
+    if render is None:
+        render = lambda ph, text: ph.markdown(text)
+    parts = []
+    last_draw = 0.0
+    for chunk in chunks:
+        parts.append(chunk)
+        now = time.monotonic()
+        if now - last_draw >= interval:
+            render(placeholder, "".join(parts) + " ▌")
+            last_draw = now
+    text = "".join(parts)
+    render(placeholder, text)
+    return text